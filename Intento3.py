@@ -1,28 +1,43 @@
 import streamlit as st
-import json
 import os
+import uuid
 from datetime import datetime
-from io import BytesIO
-from PIL import Image
+
+from sofa import metricas
+from sofa.codificacion import preparar_descarga
+from sofa.memoria_fotos import MEMORIA_FOTOS
+from sofa.registros import abrir_registros, clave_idempotencia
 
 # --------------------------
 # Config y archivo de datos
 # --------------------------
-DATA_FILE = "DATOS USUARIOS.json"
+DATA_FILE = "DATOS USUARIOS.json"  # formato anterior, se importa una sola vez
+REGISTROS_FILE = os.environ.get("SOFA_REGISTROS", "registros_sofa.db")
+
+@st.cache_resource
+def iniciar_metricas():
+    """Endpoint /metrics o volcado JSON (solo con SOFA_METRICAS=1)"""
+    return metricas.iniciar_exportacion()
+
+@st.cache_resource
+def obtener_registros():
+    return abrir_registros(REGISTROS_FILE, origen="dragon", legado=DATA_FILE)
 
 def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return list(obtener_registros().iterar())
 
+@metricas.medir("guardar_registro")
 def save_data(new_entry):
-    data = load_data()
-    data.append(new_entry)
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    # Un envío repetido del mismo formulario (reintento tras un corte) no se duplica;
+    # el envío se renueva al guardar para que el siguiente visitante del kiosco cuente aparte
+    clave = clave_idempotencia(st.session_state.sesion_id, st.session_state.envio_id,
+                               new_entry["nombre"], new_entry["celular"], new_entry["correo"])
+    obtener_registros().agregar_sin_duplicar([(clave, new_entry)])
+    st.session_state.envio_id = uuid.uuid4().hex
+    metricas.contar("registros")
 
 st.set_page_config(page_title="Registro USTA", page_icon="🐉🤖", layout="centered")
+iniciar_metricas()
 
 # --------------------------
 # Estados en session_state
@@ -31,10 +46,16 @@ if "form_enviado" not in st.session_state:
     st.session_state.form_enviado = False
 if "abrir_camara" not in st.session_state:
     st.session_state.abrir_camara = False
-if "foto_bytes" not in st.session_state:
-    st.session_state.foto_bytes = None
+if "foto_clave" not in st.session_state:  # los bytes viven en MEMORIA_FOTOS, aquí solo la clave
+    st.session_state.foto_clave = None
+if "descarga" not in st.session_state:  # (mime, nombre_archivo) de la foto actual
+    st.session_state.descarga = None
 if "foto_descargada" not in st.session_state:
     st.session_state.foto_descargada = False
+if "sesion_id" not in st.session_state:
+    st.session_state.sesion_id = uuid.uuid4().hex
+if "envio_id" not in st.session_state:  # un envío del formulario; se renueva al guardar
+    st.session_state.envio_id = uuid.uuid4().hex
 if "interes_uni_actual" not in st.session_state:  
     st.session_state.interes_uni_actual = "Sí"
 
@@ -43,6 +64,11 @@ if "interes_uni_actual" not in st.session_state:
 # --------------------------
 st.title("🐉🤖 Registro con el Dragón y Pepper - USTA")
 st.markdown("Llena tus datos para que la universidad pueda contactarte.")
+if os.environ.get("SOFA_INGESTA_URL"):
+    # mismo formulario en la PWA sin conexión (sofa/ingesta.py), con los campos de esta página
+    url_ingesta = os.environ["SOFA_INGESTA_URL"]
+    url_ingesta += ("&" if "?" in url_ingesta else "?") + "origen=dragon"
+    st.caption(f"📶 ¿Red lenta? [Regístrate con el formulario sin conexión]({url_ingesta})")
 
 
 interes_uni = st.radio("¿Quieres ingresar a la Universidad Santo Tomás?", ["Sí", "No"])
@@ -96,44 +122,63 @@ if st.session_state.form_enviado:
 
     # Si la foto ya fue descargada, reiniciar todo
     if st.session_state.foto_descargada:
-        st.session_state.foto_bytes = None
+        MEMORIA_FOTOS.eliminar_sesion(st.session_state.sesion_id)
+        st.session_state.foto_clave = None
+        st.session_state.descarga = None
         st.session_state.abrir_camara = False
         st.session_state.foto_descargada = False
         st.success("🎉 ¡Proceso completado! Puedes llenar otro formulario si lo deseas.")
         st.balloons()
     
-    elif not st.session_state.abrir_camara and st.session_state.foto_bytes is None:
+    elif not st.session_state.abrir_camara and st.session_state.foto_clave is None:
         if st.button("Tomar foto"):
             st.session_state.abrir_camara = True
             st.rerun()
 
     elif st.session_state.abrir_camara:
         camara = st.camera_input("Haz clic para tomar tu foto")
-        if camara is not None and st.session_state.foto_bytes is None:
+        if camara is not None and st.session_state.foto_clave is None:
             try:
                 foto_b = camara.getvalue()
             except Exception:
                 foto_b = camara.read()
-            st.session_state.foto_bytes = foto_b
+            st.session_state.foto_clave = MEMORIA_FOTOS.guardar(st.session_state.sesion_id, foto_b)
+            st.session_state.descarga = None
             st.session_state.abrir_camara = False
             st.rerun()
 
-    elif st.session_state.foto_bytes is not None:
-        img = Image.open(BytesIO(st.session_state.foto_bytes))
-        st.image(img, caption="Tu foto con Pepper y el Dragón", use_container_width=True)
+    elif st.session_state.foto_clave is not None:
+        clave = st.session_state.foto_clave
+        datos = MEMORIA_FOTOS.leer(clave)
+        if datos is None:
+            # la sesión estuvo inactiva demasiado tiempo y la foto se descartó
+            st.session_state.foto_clave = None
+            st.session_state.descarga = None
+            st.warning("⌛ La foto expiró por inactividad. Tómala de nuevo.")
+            if st.button("Tomar foto"):
+                st.session_state.abrir_camara = True
+                st.rerun()
+            st.stop()
+
+        # La foto para descargar se prepara una sola vez por captura y reemplaza
+        # a la original; en los reruns siguientes solo se reutiliza
+        if st.session_state.descarga is None:
+            datos, mime, extension = preparar_descarga(datos)
+            MEMORIA_FOTOS.reemplazar(clave, datos)
+            nombre_archivo = f"Mi Foto Con PEPER y DRAGON{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+            st.session_state.descarga = (mime, nombre_archivo)
+        mime, nombre_archivo = st.session_state.descarga
 
-        buf = BytesIO()
-        img.save(buf, format="PNG")
-        png_bytes = buf.getvalue()
+        st.image(datos, caption="Tu foto con Pepper y el Dragón", use_container_width=True)
 
         col1, col2 = st.columns(2)
         
         with col1:
             st.download_button(
                 label="⬇️ Descargar foto",
-                data=png_bytes,
-                file_name=f"Mi Foto Con PEPER y DRAGON{datetime.now().strftime('%Y%m%d_%H%M%S')}.png",
-                mime="image/png",
+                data=datos,
+                file_name=nombre_archivo,
+                mime=mime,
                 use_container_width=True
             )
         
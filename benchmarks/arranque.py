@@ -0,0 +1,162 @@
+"""Benchmark del arranque en frío de app.py y prueba.py.
+
+Cada medición corre en un intérprete nuevo (como un servidor recién
+reiniciado) y toma el tiempo de los imports que hace el script antes de
+pintar la primera página. Se compara contra los imports que se hacían antes
+(cv2/numpy en app.py, mediapipe/rembg/webrtc en prueba.py) y se mide aparte lo
+que ahora paga el hilo de precarga. Con streamlit instalado también se mide la
+primera corrida completa del script con AppTest.
+
+    python benchmarks/arranque.py --repeticiones 5 --salida bench_arranque.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Imports de primer nivel de cada script, hoy y antes de hacerlos perezosos
+IMPORTS = {
+    "app": ["streamlit", "sofa.metricas", "sofa.almacen", "sofa.fotos", "sofa.galeria", "sofa.registros",
+            "sofa.retencion", "sofa.codificacion", "sofa.trabajos"],
+    "prueba": ["streamlit", "PIL.Image", "sofa.fotos", "sofa.galeria", "sofa.memoria_fotos",
+               "sofa.segmentacion", "sofa.trabajos", "sofa.vista_previa"],
+}
+IMPORTS_ANTES = {
+    "app": IMPORTS["app"] + ["cv2", "numpy", "PIL.Image"],
+    "prueba": IMPORTS["prueba"] + ["mediapipe", "rembg", "av", "streamlit_webrtc"],
+}
+SCRIPTS = {"app": os.path.join("pagina_basica", "app.py"), "prueba": "prueba.py"}
+METODOS = ["mediapipe", "rembg", "grabcut"]
+
+_MEDIR_IMPORTS = """
+import importlib, json, sys, time
+sys.path.insert(0, {raiz!r})
+t = time.perf_counter()
+for m in {modulos!r}:
+    importlib.import_module(m)
+print(json.dumps(time.perf_counter() - t))
+"""
+
+_MEDIR_PRECARGA = """
+import json, sys, time
+sys.path.insert(0, {raiz!r})
+from sofa import segmentacion
+t = time.perf_counter()
+usado = segmentacion.precargar({metodo!r})
+print(json.dumps([time.perf_counter() - t, usado]))
+"""
+
+_MEDIR_APPTEST = """
+import json, os, sys, time
+sys.path.insert(0, {raiz!r})
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+os.chdir({trabajo!r})
+at = AppTest.from_file({script!r}, default_timeout=120)
+at.run()
+print(json.dumps([time.perf_counter() - t, [str(e.value) for e in at.exception]]))
+"""
+
+
+def _instalado(modulo):
+    try:
+        return importlib.util.find_spec(modulo.split(".")[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _correr(codigo):
+    """Ejecutar `codigo` en un intérprete nuevo y devolver lo que imprime como JSON"""
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True,
+                            cwd=RAIZ, timeout=600)
+    if salida.returncode != 0:
+        raise RuntimeError(salida.stderr.strip().splitlines()[-1] if salida.stderr else "falló")
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def _resumen(tiempos):
+    return {"mediana_ms": round(statistics.median(tiempos) * 1000, 1),
+            "min_ms": round(min(tiempos) * 1000, 1),
+            "max_ms": round(max(tiempos) * 1000, 1)}
+
+
+def _medir_imports(modulos, repeticiones):
+    modulos = [m for m in modulos if _instalado(m)]
+    tiempos = [_correr(_MEDIR_IMPORTS.format(raiz=RAIZ, modulos=modulos)) for _ in range(repeticiones)]
+    return {"modulos": modulos, **_resumen(tiempos)}
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frío")
+    parser.add_argument("--scripts", nargs="+", default=list(SCRIPTS), choices=list(SCRIPTS))
+    parser.add_argument("--metodos", nargs="+", default=METODOS, choices=METODOS)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--sin-apptest", action="store_true",
+                        help="no medir la primera corrida completa con AppTest")
+    parser.add_argument("--salida", default="bench_arranque.json")
+    args = parser.parse_args()
+
+    resultados = {"imports": {}, "precarga": {}, "primera_corrida": {}}
+    for nombre in args.scripts:
+        ahora = _medir_imports(IMPORTS[nombre], args.repeticiones)
+        antes = _medir_imports(IMPORTS_ANTES[nombre], args.repeticiones)
+        resultados["imports"][nombre] = {"ahora": ahora, "antes": antes}
+        print(f"{nombre:7s} imports ahora {ahora['mediana_ms']:8.1f} ms   antes {antes['mediana_ms']:8.1f} ms")
+
+    # Lo que se movió al hilo de precarga (ya no bloquea la primera página)
+    for metodo in args.metodos:
+        try:
+            medidas = [_correr(_MEDIR_PRECARGA.format(raiz=RAIZ, metodo=metodo))
+                       for _ in range(args.repeticiones)]
+        except RuntimeError as e:
+            print(f"- precarga {metodo}: {e}, se omite")
+            continue
+        usado = medidas[0][1]
+        resultados["precarga"][metodo] = {"usado": usado, **_resumen([m[0] for m in medidas])}
+        print(f"precarga {metodo:10s} ({usado}) {resultados['precarga'][metodo]['mediana_ms']:8.1f} ms")
+
+    if not args.sin_apptest and _instalado("streamlit"):
+        for nombre in args.scripts:
+            # carpeta vacía: el script crea sus carpetas y almacenes sin tocar los del repo
+            with tempfile.TemporaryDirectory() as trabajo:
+                try:
+                    tiempo, errores = _correr(_MEDIR_APPTEST.format(
+                        raiz=RAIZ, trabajo=trabajo, script=os.path.join(RAIZ, SCRIPTS[nombre])))
+                except RuntimeError as e:
+                    print(f"- primera corrida {nombre}: {e}, se omite")
+                    continue
+            resultados["primera_corrida"][nombre] = {"ms": round(tiempo * 1000, 1), "errores": errores}
+            print(f"{nombre:7s} primera corrida (AppTest) {tiempo * 1000:8.1f} ms")
+    elif not args.sin_apptest:
+        print("- primera corrida: streamlit no instalado, se omite")
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump({
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "resultados": resultados,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,540 @@
+"""Prueba de carga: N visitantes simultáneos recorriendo el flujo completo.
+
+Levanta `streamlit run` con pagina_basica/app.py o Intento3.py en una carpeta
+temporal (registros y fotos aparte de los del repo) y simula cada visitante
+como lo haría el navegador: un websocket a /_stcore/stream con los mensajes
+protobuf de Streamlit, la foto subida por /_stcore/upload_file y la descarga
+por la URL de /media. Cada visitante pasa por nombre -> interés -> cámara (con
+una foto de muestra) -> finalizar -> descarga.
+
+Reporta p50/p95/p99 por paso, visitantes por minuto, errores, registros
+perdidos (visitantes a los que la app confirmó el registro y que no están en
+el almacén) y el RSS del servidor (con sus trabajadores) a lo largo de la prueba.
+
+    python benchmarks/carga.py --script app --visitantes 60 --concurrencia 15 --salida bench_carga.json
+    python benchmarks/carga.py --script intento3 --fotos fotos_stand/a.jpg --concurrencia 30
+
+Requiere streamlit instalado (usa su cliente tornado y sus protos). Con
+--url se usa un servidor ya levantado; en ese caso el RSS necesita --pid y los
+registros perdidos --registros.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+SCRIPTS = {
+    "app": {"ruta": os.path.join("pagina_basica", "app.py"), "origen": "stand"},
+    "intento3": {"ruta": "Intento3.py", "origen": "dragon"},
+}
+
+
+class ErrorPaso(Exception):
+    """El paso terminó, pero la página no muestra lo esperado"""
+
+
+# -----------------------
+# Cliente de una sesión (lo que hace el navegador)
+# -----------------------
+class Sesion:
+    def __init__(self, base, timeout):
+        self.base = base
+        self.timeout = timeout
+        self.ws = None
+        self.id_sesion = None
+        self.elementos = []  # (tipo, proto) de la última corrida completa
+        self.valores = {}    # id del widget -> WidgetState que se reenvía en cada corrida
+
+    async def abrir(self):
+        from tornado.websocket import websocket_connect
+        url = "ws" + self.base[len("http"):] + "/_stcore/stream"
+        self.ws = await asyncio.wait_for(websocket_connect(url, subprotocols=["streamlit"]), self.timeout)
+
+    def cerrar(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    async def _enviar(self, back):
+        await self.ws.write_message(back.SerializeToString(), binary=True)
+
+    async def _leer(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        datos = await asyncio.wait_for(self.ws.read_message(), self.timeout)
+        if datos is None:
+            raise ConnectionError("el servidor cerró el websocket")
+        msg = ForwardMsg()
+        msg.ParseFromString(datos)
+        return msg
+
+    async def correr(self, disparar=None):
+        """Pedir una corrida del script (como al tocar un widget) y esperar a que termine"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        back = BackMsg()
+        back.rerun_script.query_string = ""
+        for estado in self.valores.values():
+            back.rerun_script.widget_states.widgets.add().CopyFrom(estado)
+        if disparar is not None:
+            # los botones valen True solo en la corrida que disparan
+            boton = back.rerun_script.widget_states.widgets.add()
+            boton.id = disparar
+            boton.trigger_value = True
+        await self._enviar(back)
+
+        while True:
+            msg = await self._leer()
+            tipo = msg.WhichOneof("type")
+            if tipo == "new_session":
+                # empieza una corrida (también las de st.rerun dentro del script)
+                self.elementos = []
+                if msg.new_session.HasField("initialize") and msg.new_session.initialize.session_id:
+                    self.id_sesion = msg.new_session.initialize.session_id
+            elif tipo == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                elemento = msg.delta.new_element
+                nombre = elemento.WhichOneof("type")
+                self.elementos.append((nombre, getattr(elemento, nombre)))
+            elif tipo == "script_finished" and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        errores = [e.message for t, e in self.elementos if t == "exception"]
+        if errores:
+            raise ErrorPaso(f"excepción en el script: {errores[0]}")
+
+    def buscar(self, tipo, etiqueta):
+        for t, elemento in self.elementos:
+            if t == tipo and etiqueta in elemento.label:
+                return elemento
+        raise ErrorPaso(f"no aparece {tipo} '{etiqueta}'")
+
+    def textos(self):
+        partes = []
+        for t, elemento in self.elementos:
+            if t in ("alert", "markdown", "heading"):
+                partes.append(elemento.body)
+        return "\n".join(partes)
+
+    def esperar_texto(self, texto):
+        if texto not in self.textos():
+            raise ErrorPaso(f"no aparece el texto '{texto}'")
+
+    def escribir(self, etiqueta, texto):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        estado = WidgetState(id=self.buscar("text_input", etiqueta).id, string_value=texto)
+        self.valores[estado.id] = estado
+
+    def marcar(self, etiqueta, valor=True):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        estado = WidgetState(id=self.buscar("checkbox", etiqueta).id, bool_value=valor)
+        self.valores[estado.id] = estado
+
+    def boton(self, etiqueta):
+        return self.buscar("button", etiqueta).id
+
+    async def subir_foto(self, etiqueta, datos, nombre="foto.jpg"):
+        """Lo que hace st.camera_input al capturar: pedir URLs, subir el archivo y correr el script"""
+        from tornado.httpclient import AsyncHTTPClient
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        camara = self.buscar("camera_input", etiqueta)
+        back = BackMsg()
+        back.file_urls_request.request_id = uuid.uuid4().hex
+        back.file_urls_request.file_names.append(nombre)
+        back.file_urls_request.session_id = self.id_sesion or ""
+        await self._enviar(back)
+        while True:
+            msg = await self._leer()
+            if msg.WhichOneof("type") == "file_urls_response":
+                break
+        respuesta = msg.file_urls_response
+        if respuesta.error_msg:
+            raise ErrorPaso(f"subida rechazada: {respuesta.error_msg}")
+        urls = respuesta.file_urls[0]
+
+        limite = uuid.uuid4().hex
+        cuerpo = (f"--{limite}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{nombre}\"\r\n"
+                  f"Content-Type: image/jpeg\r\n\r\n").encode() + datos + f"\r\n--{limite}--\r\n".encode()
+        url = urls.upload_url if urls.upload_url.startswith("http") else self.base + urls.upload_url
+        await AsyncHTTPClient().fetch(url, method="PUT", body=cuerpo, request_timeout=self.timeout,
+                                      headers={"Content-Type": f"multipart/form-data; boundary={limite}"})
+
+        estado = WidgetState(id=camara.id)
+        info = estado.file_uploader_state_value.uploaded_file_info.add()
+        info.file_id = urls.file_id
+        info.name = nombre
+        info.size = len(datos)
+        info.file_urls.CopyFrom(urls)
+        self.valores[estado.id] = estado
+        await self.correr()
+
+    async def descargar(self, etiqueta):
+        from tornado.httpclient import AsyncHTTPClient
+        boton = self.buscar("download_button", etiqueta)
+        url = boton.url if boton.url.startswith("http") else self.base + boton.url
+        respuesta = await AsyncHTTPClient().fetch(url, request_timeout=self.timeout)
+        if not respuesta.body:
+            raise ErrorPaso("descarga vacía")
+        return respuesta.body
+
+
+# -----------------------
+# Flujos de cada script
+# -----------------------
+async def flujo_app(s, paso, nombre, foto):
+    await paso("abrir", s.correr)
+    s.escribir("nombre completo", nombre)
+    await paso("nombre", s.correr)
+    # el radio de interés queda en su primera opción; el contacto dispara la corrida
+    s.escribir("Email o teléfono", f"{nombre.replace(' ', '.')}@carga.test")
+    await paso("interes", s.correr)
+    await paso("activar_camara", lambda: s.correr(s.boton("Activar cámara")))
+    await paso("foto", lambda: s.subir_foto("Toma tu foto", foto), espera="Foto guardada")
+    await paso("finalizar", lambda: s.correr(s.boton("Finalizar registro")), espera="Gracias por registrarte",
+               confirma=True)
+    s.marcar("He completado el formulario")
+    await paso("formulario_google", s.correr)
+    await paso("descarga", lambda: s.descargar("Descargar tu foto"))
+
+
+async def flujo_intento3(s, paso, nombre, foto):
+    await paso("abrir", s.correr)
+    s.escribir("Nombre completo", nombre)
+    s.escribir("celular", "3000000000")
+    s.escribir("Correo", f"{nombre.replace(' ', '.')}@carga.test")
+    # nombre e interés van juntos: el formulario solo corre el script al enviarse
+    await paso("formulario", lambda: s.correr(s.boton("Enviar datos")), espera="Tus datos han sido guardados",
+               confirma=True)
+    await paso("activar_camara", lambda: s.correr(s.boton("Tomar foto")))
+    await paso("foto", lambda: s.subir_foto("Haz clic para tomar tu foto", foto))
+    await paso("descarga", lambda: s.descargar("Descargar foto"))
+    await paso("finalizar", lambda: s.correr(s.boton("Finalizar")), espera="Proceso completado")
+
+
+FLUJOS = {"app": flujo_app, "intento3": flujo_intento3}
+
+
+# -----------------------
+# Carga
+# -----------------------
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _resumen(tiempos):
+    if not tiempos:
+        return {"n": 0}
+    ordenados = sorted(tiempos)
+    return {"n": len(ordenados),
+            "p50_ms": round(_percentil(ordenados, 50) * 1000, 1),
+            "p95_ms": round(_percentil(ordenados, 95) * 1000, 1),
+            "p99_ms": round(_percentil(ordenados, 99) * 1000, 1),
+            "max_ms": round(ordenados[-1] * 1000, 1),
+            "media_ms": round(statistics.mean(ordenados) * 1000, 1)}
+
+
+async def _visitante(base, flujo, numero, prefijo, foto, timeout, tiempos, errores):
+    """Un visitante de punta a punta; devuelve su nombre si la app le confirmó el registro"""
+    nombre = f"{prefijo} {numero:04d}"
+    confirmado = []
+    fallado = []
+    s = Sesion(base, timeout)
+
+    async def paso(etapa, accion, espera=None, confirma=False):
+        inicio = time.perf_counter()
+        try:
+            await accion()
+            if espera:
+                s.esperar_texto(espera)
+        except Exception as e:
+            errores.append({"visitante": numero, "paso": etapa, "error": f"{type(e).__name__}: {e}"})
+            fallado.append(etapa)
+            raise
+        tiempos.setdefault(etapa, []).append(time.perf_counter() - inicio)
+        if confirma:
+            confirmado.append(nombre)
+
+    try:
+        await s.abrir()
+        await flujo(s, paso, nombre, foto)
+    except Exception as e:
+        if not fallado:
+            errores.append({"visitante": numero, "paso": "conexion", "error": f"{type(e).__name__}: {e}"})
+        return confirmado[0] if confirmado else None, False
+    finally:
+        s.cerrar()
+    return nombre, True
+
+
+async def correr_carga(base, script, visitantes, concurrencia, rampa, fotos, timeout):
+    flujo = FLUJOS[script]
+    prefijo = f"Carga {uuid.uuid4().hex[:6]}"
+    tiempos, errores = {}, []
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def uno(numero):
+        # los primeros `concurrencia` entran escalonados a lo largo de la rampa
+        if numero < concurrencia and rampa:
+            await asyncio.sleep(rampa * numero / concurrencia)
+        async with semaforo:
+            inicio = time.perf_counter()
+            resultado = await _visitante(base, flujo, numero, prefijo, fotos[numero % len(fotos)],
+                                         timeout, tiempos, errores)
+            if resultado[1]:
+                tiempos.setdefault("total", []).append(time.perf_counter() - inicio)
+            return resultado
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(uno(i) for i in range(visitantes)))
+    duracion = time.perf_counter() - inicio
+    return {
+        "prefijo": prefijo,
+        "duracion_s": round(duracion, 2),
+        "completos": sum(1 for _, ok in resultados if ok),
+        "confirmados": [n for n, _ in resultados if n],
+        "tiempos": tiempos,
+        "errores": errores,
+    }
+
+
+# -----------------------
+# Servidor, RSS y registros
+# -----------------------
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _levantar_servidor(script, trabajo, puerto, entorno):
+    comando = [sys.executable, "-m", "streamlit", "run", os.path.join(RAIZ, SCRIPTS[script]["ruta"]),
+               "--server.headless", "true", "--server.port", str(puerto), "--server.address", "127.0.0.1",
+               "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false",
+               # el cliente de carga no maneja la cookie XSRF de las subidas
+               "--server.enableXsrfProtection", "false"]
+    proceso = subprocess.Popen(comando, cwd=trabajo, env=entorno,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base = f"http://127.0.0.1:{puerto}"
+    limite = time.time() + 60
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"streamlit terminó al arrancar: {proceso.stderr.read().decode()[-500:]}")
+        try:
+            with socket.create_connection(("127.0.0.1", puerto), timeout=1):
+                return proceso, base
+        except OSError:
+            time.sleep(0.3)
+    proceso.kill()
+    raise RuntimeError("streamlit no respondió en 60 s")
+
+
+def _rss_arbol_mb(pid):
+    """RSS del proceso y sus hijos (el pool de trabajadores), en MB"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            raiz = psutil.Process(pid)
+            procesos = [raiz] + raiz.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for p in procesos:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 1024 / 1024
+    if not os.path.isdir("/proc"):
+        return None
+    # sin psutil: recorrer /proc (Linux)
+    padres = {}
+    for nombre in os.listdir("/proc"):
+        if nombre.isdigit():
+            try:
+                with open(f"/proc/{nombre}/stat") as f:
+                    campos = f.read().rsplit(")", 1)[1].split()
+                padres[int(nombre)] = int(campos[1])
+            except (OSError, IndexError):
+                pass
+    arbol, pendientes = set(), [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        arbol.add(actual)
+        pendientes.extend(p for p, padre in padres.items() if padre == actual and p not in arbol)
+    total = 0
+    for p in arbol:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for linea in f:
+                    if linea.startswith("VmRSS:"):
+                        total += int(linea.split()[1]) * 1024
+        except OSError:
+            pass
+    return total / 1024 / 1024
+
+
+class MuestreoRSS(threading.Thread):
+    def __init__(self, pid, intervalo=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.muestras = []  # (segundos desde el inicio, MB)
+        self._parar = threading.Event()
+
+    def run(self):
+        inicio = time.perf_counter()
+        while not self._parar.is_set():
+            mb = _rss_arbol_mb(self.pid)
+            if mb is not None:
+                self.muestras.append((round(time.perf_counter() - inicio, 2), round(mb, 1)))
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+def _registros_perdidos(ruta, origen, prefijo, confirmados):
+    from sofa.registros import abrir_registros
+    vistos = {}
+    for registro in abrir_registros(ruta, origen=origen).iterar():
+        nombre = registro.get("nombre") or ""
+        if nombre.startswith(prefijo):
+            vistos[nombre] = vistos.get(nombre, 0) + 1
+    return {"perdidos": sorted(n for n in confirmados if n not in vistos),
+            "duplicados": sorted(n for n, veces in vistos.items() if veces > 1),
+            "en_almacen": len(vistos)}
+
+
+def _fotos_muestra(rutas):
+    if rutas:
+        fotos = []
+        for ruta in rutas:
+            with open(ruta, "rb") as f:
+                fotos.append(f.read())
+        return fotos
+    # foto sintética de 1280x720 (lo que entrega una webcam típica)
+    from PIL import Image, ImageDraw
+    imagen = Image.new("RGB", (1280, 720), (90, 120, 160))
+    dibujo = ImageDraw.Draw(imagen)
+    dibujo.ellipse((560, 150, 720, 350), fill=(200, 160, 130))
+    dibujo.ellipse((460, 360, 820, 900), fill=(30, 60, 150))
+    buffer = io.BytesIO()
+    imagen.save(buffer, format="JPEG", quality=90)
+    return [buffer.getvalue()]
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con visitantes simultáneos")
+    parser.add_argument("--script", default="app", choices=list(SCRIPTS))
+    parser.add_argument("--visitantes", type=int, default=40, help="visitantes en total")
+    parser.add_argument("--concurrencia", type=int, default=10, help="sesiones abiertas a la vez")
+    parser.add_argument("--rampa", type=float, default=5.0, help="segundos para llegar a la concurrencia")
+    parser.add_argument("--fotos", nargs="*", help="fotos de muestra (por defecto una sintética 720p)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="segundos máximos por paso")
+    parser.add_argument("--url", help="usar un servidor ya levantado en lugar de arrancar uno")
+    parser.add_argument("--pid", type=int, help="con --url: proceso del servidor para medir RSS")
+    parser.add_argument("--registros", help="con --url: almacén de registros del servidor")
+    parser.add_argument("--salida", default="bench_carga.json")
+    args = parser.parse_args()
+
+    fotos = _fotos_muestra(args.fotos)
+    origen = SCRIPTS[args.script]["origen"]
+    with tempfile.TemporaryDirectory() as trabajo:
+        proceso = None
+        if args.url:
+            base, pid, registros = args.url.rstrip("/"), args.pid, args.registros
+        else:
+            registros = os.path.join(trabajo, "registros_carga.db")
+            entorno = dict(os.environ, SOFA_REGISTROS=registros,
+                           SOFA_FOTOS=os.path.join(trabajo, "fotos_stand"),
+                           PYTHONPATH=os.pathsep.join(filter(None, [RAIZ, os.environ.get("PYTHONPATH")])))
+            proceso, base = _levantar_servidor(args.script, trabajo, _puerto_libre(), entorno)
+            pid = proceso.pid
+            print(f"Servidor {args.script} en {base} (pid {pid})")
+
+        muestreo = MuestreoRSS(pid) if pid else None
+        if muestreo:
+            muestreo.start()
+        try:
+            carga = asyncio.run(correr_carga(base, args.script, args.visitantes, args.concurrencia,
+                                             args.rampa, fotos, args.timeout))
+        finally:
+            if muestreo:
+                muestreo.parar()
+            if proceso is not None:
+                proceso.terminate()
+                try:
+                    proceso.wait(10)
+                except subprocess.TimeoutExpired:
+                    proceso.kill()
+
+        perdidos = (_registros_perdidos(registros, origen, carga["prefijo"], carga["confirmados"])
+                    if registros else None)
+
+    pasos = {etapa: _resumen(t) for etapa, t in carga["tiempos"].items()}
+    rss = muestreo.muestras if muestreo else []
+    resultados = {
+        "script": args.script,
+        "visitantes": args.visitantes,
+        "concurrencia": args.concurrencia,
+        "duracion_s": carga["duracion_s"],
+        "completos": carga["completos"],
+        "visitantes_por_minuto": round(carga["completos"] / carga["duracion_s"] * 60, 1),
+        "errores": len(carga["errores"]),
+        "errores_por_paso": {},
+        "registros": perdidos,
+        "pasos": pasos,
+        "rss_mb": {"inicio": rss[0][1] if rss else None, "pico": max((m for _, m in rss), default=None),
+                   "final": rss[-1][1] if rss else None, "muestras": rss},
+        "detalle_errores": carga["errores"][:50],
+    }
+    for error in carga["errores"]:
+        resultados["errores_por_paso"][error["paso"]] = resultados["errores_por_paso"].get(error["paso"], 0) + 1
+
+    for etapa, r in pasos.items():
+        if r["n"]:
+            print(f"{etapa:18s} n={r['n']:4d}  p50 {r['p50_ms']:8.1f} ms  p95 {r['p95_ms']:8.1f} ms  "
+                  f"p99 {r['p99_ms']:8.1f} ms")
+    print(f"{carga['completos']}/{args.visitantes} visitantes completos en {carga['duracion_s']} s "
+          f"({resultados['visitantes_por_minuto']} por minuto), {resultados['errores']} errores")
+    if perdidos is not None:
+        print(f"registros: {len(perdidos['perdidos'])} perdidos, {len(perdidos['duplicados'])} duplicados")
+    if rss:
+        print(f"RSS del servidor: {resultados['rss_mb']['inicio']} -> pico {resultados['rss_mb']['pico']} MB")
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump({
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "resultados": resultados,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Benchmark de los métodos de segmentación y de la composición del fondo.
+
+Mide por etapa (resize, segment, upscale, blur, blend, encode) y de punta a
+punta (componer_fondo) a 480p, 720p, 1080p y 4K, con imágenes sintéticas o
+con fotos de muestra. Cada caso corre en un proceso nuevo para que el pico de
+RSS sea el de ese caso. Los métodos cuya librería no está instalada se saltan.
+
+    python benchmarks/segmentacion.py --repeticiones 5 --salida bench_segmentacion.json
+    python benchmarks/segmentacion.py --imagenes fotos_stand/a.jpg --metodos grabcut
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+TAMANOS = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+METODOS = ["mediapipe", "rembg", "grabcut"]
+
+
+def _imagen_sintetica(tam):
+    """Fondo con ruido y gradiente más una silueta (cabeza y torso) en tonos de piel"""
+    import cv2
+    import numpy as np
+    W, H = tam
+    rng = np.random.default_rng(0)
+    img = np.empty((H, W, 3), np.uint8)
+    img[...] = np.linspace(40, 200, W, dtype=np.uint8)[None, :, None]
+    img = cv2.add(img, rng.integers(0, 40, (H, W, 3), dtype=np.uint8))
+    cx, escala = W // 2, H / 480
+    cv2.ellipse(img, (cx, int(170 * escala)), (int(55 * escala), int(70 * escala)), 0, 0, 360,
+                (200, 160, 130), -1)
+    cv2.ellipse(img, (cx, int(420 * escala)), (int(150 * escala), int(170 * escala)), 0, 0, 360,
+                (30, 60, 150), -1)
+    return img
+
+
+def _rss_pico_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB y macOS bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _resumen(tiempos):
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(round(0.95 * (len(ordenados) - 1))))]
+    return {"mediana_ms": round(statistics.median(ordenados) * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "min_ms": round(ordenados[0] * 1000, 2)}
+
+
+def _caso(metodo, nombre_tam, ruta_imagen, fondo_path, repeticiones):
+    """Correr un (método, tamaño) y devolver tiempos por etapa; se ejecuta en su propio proceso"""
+    import cv2
+    import numpy as np
+    from PIL import Image
+    from sofa import segmentacion as seg
+
+    tam = TAMANOS[nombre_tam]
+    if ruta_imagen:
+        imagen = Image.open(ruta_imagen).convert("RGB").resize(tam, Image.LANCZOS)
+    else:
+        imagen = Image.fromarray(_imagen_sintetica(tam))
+    segmentar = {"mediapipe": seg._segment_mediapipe, "rembg": seg._segment_rembg,
+                 "grabcut": seg._segment_grabcut}[metodo]
+
+    etapas = {e: [] for e in ("resize", "segment", "upscale", "blur", "blend", "encode", "total")}
+    fg = np.asarray(imagen)
+    bg = seg.cargar_fondo(fondo_path, imagen.size)
+
+    t0 = time.perf_counter()
+    seg.componer_fondo(imagen, fondo_path, method=metodo)  # carga de modelos, no se promedia
+    primera = time.perf_counter() - t0
+
+    for _ in range(repeticiones):
+        t = time.perf_counter()
+        small, _ = seg._resize_for_seg(imagen, max_side=512)
+        etapas["resize"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        mascara, _ = segmentar(small)
+        etapas["segment"].append(time.perf_counter() - t)
+        if mascara is None:
+            mascara = np.ones((small.size[1], small.size[0]), np.float32)
+
+        t = time.perf_counter()
+        mascara = cv2.resize(mascara, imagen.size, interpolation=cv2.INTER_LINEAR)
+        etapas["upscale"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        alfa = cv2.convertScaleAbs(mascara, alpha=255.0)
+        cv2.GaussianBlur(alfa, (15, 15), 0, dst=alfa)
+        etapas["blur"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        comp = seg.mezclar(fg, bg, mascara, suavizado=0)
+        etapas["blend"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        Image.fromarray(comp).save(io.BytesIO(), format="JPEG", quality=95)
+        etapas["encode"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        seg.componer_fondo(imagen, fondo_path, method=metodo)
+        etapas["total"].append(time.perf_counter() - t)
+
+    total = sum(etapas["total"])
+    return {
+        "metodo": metodo,
+        "tamano": nombre_tam,
+        "imagen": ruta_imagen or "sintetica",
+        "repeticiones": repeticiones,
+        "primera_ms": round(primera * 1000, 2),
+        "etapas": {e: _resumen(t) for e, t in etapas.items()},
+        "imagenes_por_seg": round(repeticiones / total, 3) if total else None,
+        "rss_pico_mb": _rss_pico_mb(),
+    }
+
+
+def _disponibles(metodos):
+    from sofa import segmentacion as seg
+    disponibles = {"mediapipe": seg.MP_AVAILABLE, "rembg": seg.REMBG_AVAILABLE, "grabcut": True}
+    for metodo in metodos:
+        if not disponibles[metodo]:
+            print(f"- {metodo}: librería no instalada, se omite")
+    return [m for m in metodos if disponibles[m]]
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de segmentación y composición")
+    parser.add_argument("--metodos", nargs="+", default=METODOS, choices=METODOS)
+    parser.add_argument("--tamanos", nargs="+", default=list(TAMANOS), choices=list(TAMANOS))
+    parser.add_argument("--imagenes", nargs="*", default=[],
+                        help="fotos de muestra; sin esto se usan imágenes sintéticas")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--salida", default="bench_segmentacion.json")
+    args = parser.parse_args()
+
+    import numpy as np
+    from PIL import Image
+
+    metodos = _disponibles(args.metodos)
+    fondo = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
+    fondo.close()
+    gradiente = np.linspace(0, 255, 1920, dtype=np.uint8)
+    Image.fromarray(np.dstack([np.tile(gradiente, (1080, 1))] * 3)).save(fondo.name)
+
+    resultados = []
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        for imagen in args.imagenes or [None]:
+            for metodo in metodos:
+                for nombre_tam in args.tamanos:
+                    with ctx.Pool(1) as pool:
+                        r = pool.apply(_caso, (metodo, nombre_tam, imagen, fondo.name, args.repeticiones))
+                    resultados.append(r)
+                    print(f"{metodo:10s} {nombre_tam:6s} total {r['etapas']['total']['mediana_ms']:9.1f} ms  "
+                          f"segment {r['etapas']['segment']['mediana_ms']:9.1f} ms  "
+                          f"blend {r['etapas']['blend']['mediana_ms']:7.1f} ms  "
+                          f"{r['imagenes_por_seg']:6.2f} img/s  RSS {r['rss_pico_mb'] or 0:7.1f} MB")
+    finally:
+        os.remove(fondo.name)
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump({
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "resultados": resultados,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
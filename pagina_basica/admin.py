@@ -0,0 +1,99 @@
+import streamlit as st
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+# Los módulos compartidos (carpeta sofa/) viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sofa.estadisticas import Estadisticas
+from sofa.exportar import FORMATOS, exportar, formatos_disponibles
+from sofa.registros import abrir_registros
+
+# Panel para el personal del stand (no para los visitantes):
+#   streamlit run pagina_basica/admin.py --server.port 8502
+st.set_page_config(
+    page_title="SOFA 2025 - Panel del stand",
+    page_icon="📊",
+    layout="wide"
+)
+
+@st.cache_resource
+def obtener_estadisticas():
+    """Contadores compartidos por todas las sesiones del panel"""
+    registros = abrir_registros(os.environ.get("SOFA_REGISTROS", "registros_sofa.db"))
+    return Estadisticas(registros)
+
+def grafico(titulo, conteo, ordenar=True):
+    """Gráfico de barras a partir de un diccionario valor -> cantidad"""
+    st.markdown(f"#### {titulo}")
+    if not conteo:
+        st.caption("Sin registros todavía")
+        return
+    serie = pd.Series(conteo, name="Registros")
+    if ordenar:
+        serie = serie.sort_values(ascending=False)
+    st.bar_chart(serie)
+
+def exportar_registros(resumen):
+    """Formulario para descargar los registros filtrados (CSV, Parquet o XLSX)"""
+    with st.expander("⬇️ Exportar registros para admisiones"):
+        with st.form("exportar"):
+            formato = st.selectbox("Formato", formatos_disponibles())
+            rango = st.date_input("Rango de fechas (opcional)", value=[])
+            interes = st.multiselect("Interés", sorted(resumen["por_interes"]))
+            carrera = st.multiselect("Área / carrera", sorted(resumen["por_carrera"]))
+            deduplicar = st.checkbox("Un solo registro por contacto (el más reciente)", value=True)
+            preparar = st.form_submit_button("Preparar archivo")
+        if preparar:
+            desde, hasta = (rango[0], rango[1]) if len(rango) == 2 else (None, None)
+            with tempfile.TemporaryDirectory() as carpeta:
+                destino = os.path.join(carpeta, f"registros_sofa.{formato}")
+                n = exportar(obtener_estadisticas().registros, destino, formato=formato,
+                             desde=desde, hasta=hasta, interes=interes, carrera=carrera,
+                             deduplicar=deduplicar)
+                with open(destino, "rb") as f:
+                    st.session_state.exportacion = (f.read(), formato, n)
+        if st.session_state.get("exportacion"):
+            datos, formato, n = st.session_state.exportacion
+            st.download_button(
+                label=f"📥 Descargar {n} registros ({formato.upper()})",
+                data=datos,
+                file_name=f"registros_sofa_{time.strftime('%Y%m%d_%H%M')}.{formato}",
+                mime=FORMATOS[formato],
+            )
+
+def main():
+    st.title("📊 SOFA 2025 - Panel del stand")
+
+    auto = st.sidebar.checkbox("Actualizar automáticamente", value=True, key="auto_actualizar")
+    intervalo = st.sidebar.slider("Cada cuántos segundos", 2, 60, 5)
+
+    estadisticas = obtener_estadisticas()
+    nuevos = estadisticas.actualizar()
+    resumen = estadisticas.resumen()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Registros", resumen["total"], delta=nuevos or None)
+    tasa = resumen["tasa_foto"]
+    col2.metric("Se tomaron foto", f"{tasa:.0%}" if tasa is not None else "—")
+    col3.metric("Última actualización", time.strftime("%H:%M:%S"))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        grafico("Interés en la universidad", resumen["por_interes"])
+        grafico("Semestre de ingreso", resumen["por_periodo"])
+    with col2:
+        grafico("Área / carrera de interés", resumen["por_carrera"])
+        grafico("Registros por hora del día", resumen["por_hora"], ordenar=False)
+
+    exportar_registros(resumen)
+
+    if auto:
+        time.sleep(intervalo)
+        st.rerun()
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,20 @@
 import streamlit as st
-import cv2
-import numpy as np
-from PIL import Image
 import os
 from datetime import datetime
-import json
-import glob
-import base64
-import shutil
+import time
+import sys
+import uuid
+
+# Los módulos compartidos (carpeta sofa/) viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sofa import metricas
+from sofa.almacen import abrir_almacen, compartida
+from sofa.fotos import CARPETA_FOTOS, IndiceFotos, ruta_foto, ruta_miniatura
+from sofa.galeria import quitar_de_galeria
+from sofa.registros import abrir_registros, clave_idempotencia
+from sofa.retencion import Barredor
+from sofa.codificacion import extension_foto, mime_de
+from sofa.trabajos import ColaTrabajos, tarea_guardar_foto, tarea_precargar
 
 # Configuración de la página para PWA
 st.set_page_config(
@@ -17,51 +24,112 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Crear directorio para almacenar fotos si no existe
-os.makedirs("fotos_stand", exist_ok=True)
+# Crear directorio para almacenar fotos si no existe (SOFA_FOTOS, por defecto fotos_stand)
+os.makedirs(CARPETA_FOTOS, exist_ok=True)
+
+@st.cache_resource
+def obtener_registros():
+    """Almacén de registros compartido por todas las sesiones del servidor"""
+    # Se importa una sola vez el archivo que usaban las versiones anteriores
+    legado = "registros_sofa.jsonl" if os.path.exists("registros_sofa.jsonl") else "registros_sofa.json"
+    return abrir_registros(os.environ.get("SOFA_REGISTROS", "registros_sofa.db"),
+                           origen="stand", legado=legado)
+
+@st.cache_resource
+def obtener_indice_fotos():
+    """Índice de fotos por nombre, construido una vez al iniciar el servidor"""
+    # Con otros servidores escribiendo en la misma carpeta, una búsqueda sin
+    # resultado revisa el disco antes de responder que no hay foto
+    indice = IndiceFotos(CARPETA_FOTOS, compartida=compartida())
+    indice.vigilar()  # solo si watchdog está instalado
+    return indice
+
+@st.cache_resource
+def iniciar_retencion():
+    """Barrido periódico de fotos viejas o que exceden la cuota (ver sofa/retencion.py)"""
+    return Barredor(CARPETA_FOTOS, al_eliminar=obtener_indice_fotos().eliminar).iniciar()
+
+@st.cache_resource
+def obtener_cola_trabajos():
+    """Pool de procesos compartido por todas las sesiones (SOFA_TRABAJADORES procesos)"""
+    return ColaTrabajos()
+
+@st.cache_resource
+def precalentar_trabajadores():
+    """Arrancar los procesos del pool e importar PIL en ellos antes de la primera foto"""
+    obtener_cola_trabajos().precalentar(tarea_precargar)
+    return True
+
+@st.cache_resource
+def iniciar_metricas():
+    """Endpoint /metrics o volcado JSON (solo con SOFA_METRICAS=1)"""
+    return metricas.iniciar_exportacion()
+
+def ruta_vista_previa(foto_path):
+    """Miniatura para mostrar en pantalla; la foto completa solo se descarga"""
+    mini = ruta_miniatura(foto_path)
+    return mini if os.path.exists(mini) else foto_path
 
 def verificar_foto(nombre):
     """Verificar si existe una foto para el nombre dado"""
-    nombre_limpio = "".join(c for c in nombre if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    patron = f"fotos_stand/{nombre_limpio}_*.jpg"
-    fotos = glob.glob(patron)
-    return len(fotos) > 0, fotos[0] if fotos else None
+    foto = obtener_ultima_foto(nombre)
+    return foto is not None, foto
 
+@metricas.medir("ultima_foto")
 def obtener_ultima_foto(nombre):
     """Obtener la última foto tomada por el usuario"""
-    nombre_limpio = "".join(c for c in nombre if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    patron = f"fotos_stand/{nombre_limpio}_*.jpg"
-    fotos = glob.glob(patron)
-    if fotos:
-        # Ordenar por fecha (el timestamp está en el nombre)
-        fotos.sort(key=os.path.getmtime, reverse=True)
-        return fotos[0]
-    return None
+    indice = obtener_indice_fotos()
+    foto = indice.ultima(nombre)
+    if foto is None:
+        # La foto pudo guardarse en otro servidor: traerla del bucket (SOFA_FOTOS_REMOTO)
+        foto = abrir_almacen().traer_ultima(nombre)
+        if foto is not None:
+            indice.registrar(foto)
+    return foto
 
 def eliminar_foto(ruta_foto):
     """Eliminar una foto del sistema de archivos"""
     try:
         if os.path.exists(ruta_foto):
             os.remove(ruta_foto)
+            obtener_indice_fotos().eliminar(ruta_foto)
+            abrir_almacen().eliminar(ruta_foto)
+            quitar_de_galeria(ruta_foto)
+            if os.path.exists(ruta_miniatura(ruta_foto)):
+                os.remove(ruta_miniatura(ruta_foto))
             return True
     except:
         return False
     return False
 
+@st.cache_data(max_entries=32, ttl=3600, show_spinner=False)
+def leer_bytes_foto(foto_path, mtime):
+    """Leer la foto del disco una sola vez por versión del archivo (mtime)"""
+    with open(foto_path, "rb") as f:
+        return f.read()
+
+@metricas.medir("boton_descarga")
 def crear_boton_descarga(foto_path, nombre):
-    """Crear un botón de descarga para la foto"""
+    """Mostrar el botón de descarga de la foto; devuelve False si no se pudo leer"""
     try:
-        with open(foto_path, "rb") as f:
-            bytes_data = f.read()
-        b64 = base64.b64encode(bytes_data).decode()
-        nombre_archivo = f"foto_sofa_{nombre}.jpg"
-        
-        href = f'<a href="data:image/jpeg;base64,{b64}" download="{nombre_archivo}" style="background-color: #4CAF50; color: white; padding: 14px 20px; text-align: center; text-decoration: none; display: inline-block; border-radius: 5px; font-size: 16px; margin: 10px 0;">📸 Descargar tu foto</a>'
-        return href
-    except:
-        return None
+        bytes_data = leer_bytes_foto(foto_path, os.path.getmtime(foto_path))
+    except OSError:
+        return False
+    # st.download_button sirve los bytes desde una URL aparte en lugar de
+    # incrustarlos en base64 dentro de la página
+    st.download_button(
+        label="📸 Descargar tu foto",
+        data=bytes_data,
+        file_name=f"foto_sofa_{nombre}{os.path.splitext(foto_path)[1]}",
+        mime=mime_de(foto_path),
+        use_container_width=True
+    )
+    return True
 
 def main():
+    iniciar_metricas()
+    iniciar_retencion()
+    
     # CSS para mejorar la apariencia PWA
     st.markdown("""
     <style>
@@ -111,19 +179,30 @@ def main():
         st.session_state.formulario_completado = False
     if 'nombre_usuario' not in st.session_state:
         st.session_state.nombre_usuario = ""
+    if 'trabajo_foto' not in st.session_state:
+        st.session_state.trabajo_foto = None
+    if 'sesion_id' not in st.session_state:
+        st.session_state.sesion_id = uuid.uuid4().hex
+    if 'envio_id' not in st.session_state:
+        # un envío del formulario: se mantiene en los reintentos y se renueva al guardar
+        st.session_state.envio_id = uuid.uuid4().hex
     
     # Página de descarga de foto (si ya completó el registro)
     if st.session_state.mostrar_descarga and st.session_state.nombre_usuario:
         mostrar_pagina_descarga()
-        return
+    else:
+        # Página principal de registro
+        mostrar_pagina_registro()
     
-    # Página principal de registro
-    mostrar_pagina_registro()
+    # Con la página ya pintada, arrancar el pool para que la primera foto no espere
+    precalentar_trabajadores()
 
 def mostrar_pagina_registro():
     """Mostrar la página principal de registro"""
     st.title("🎓 SOFA 2025 - Universidad Santo Tomas")
     st.subheader("¡Bienvenidos a nuestro stand!")
+    if os.environ.get("SOFA_INGESTA_URL"):
+        st.caption(f"📶 ¿Red lenta? [Regístrate con el formulario sin conexión]({os.environ['SOFA_INGESTA_URL']})")
     
     # Paso 1: Nombre de la persona
     st.markdown("### Paso 1: Información personal")
@@ -200,8 +279,7 @@ def mostrar_pagina_descarga():
     if foto_path:
         # Mostrar la foto
         try:
-            image = Image.open(foto_path)
-            st.image(image, caption="Tu foto en el stand del SOFA 2024", use_container_width=True)
+            st.image(ruta_vista_previa(foto_path), caption="Tu foto en el stand del SOFA 2024", use_container_width=True)
         except:
             st.error("No se pudo cargar la foto")
             foto_path = None
@@ -227,10 +305,7 @@ def mostrar_pagina_descarga():
         # Botón para descargar foto después de completar formulario
         if formulario_completado and foto_path:
             st.markdown("### 📸 Descarga tu foto")
-            boton_descarga = crear_boton_descarga(foto_path, nombre)
-            if boton_descarga:
-                st.markdown(boton_descarga, unsafe_allow_html=True)
-                
+            if crear_boton_descarga(foto_path, nombre):
                 # Botón para confirmar descarga y eliminar foto
                 if st.button("🗑️ Eliminar foto después de descargar"):
                     if eliminar_foto(foto_path):
@@ -267,33 +342,42 @@ def tomar_foto(nombre):
     st.write("📷 Cámara activada - Sonríe para la foto!")
     
     img_file_buffer = st.camera_input("Toma tu foto", key="camera_widget")
+    cola = obtener_cola_trabajos()
     
     if img_file_buffer is not None and not st.session_state.foto_procesada:
+        st.session_state.foto_procesada = True
+        foto_filename = ruta_foto(nombre, extension_foto())
+        # El guardado corre en el pool de procesos; aquí solo se encola
+        st.session_state.trabajo_foto = cola.enviar(
+            tarea_guardar_foto, img_file_buffer.getvalue(), foto_filename)
+    
+    if st.session_state.trabajo_foto:
+        estado = cola.estado(st.session_state.trabajo_foto)
+        if estado == "pendiente":
+            st.info("⏳ Guardando tu foto...")
+            time.sleep(0.3)
+            st.rerun()
         try:
-            st.session_state.foto_procesada = True
-            image = Image.open(img_file_buffer)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            nombre_limpio = "".join(c for c in nombre if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            foto_filename = f"fotos_stand/{nombre_limpio}_{timestamp}.jpg"
-            
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-                
-            image.save(foto_filename, quality=95)
+            foto_filename = cola.resultado(st.session_state.trabajo_foto)
             
             if os.path.exists(foto_filename):
+                obtener_indice_fotos().registrar(foto_filename)
+                metricas.contar("fotos")
                 st.session_state.foto_tomada = True
                 st.session_state.foto_filename = foto_filename
                 st.success("¡Foto guardada exitosamente!")
-                st.image(image, caption="Tu foto en el stand", use_container_width=True)
+                st.image(ruta_vista_previa(foto_filename), caption="Tu foto en el stand", use_container_width=True)
             else:
                 st.error("❌ Error: No se pudo guardar la foto")
+                metricas.contar("errores_foto")
                 st.session_state.foto_procesada = False
                 
         except Exception as e:
             st.error(f"❌ Error al procesar la foto: {e}")
+            metricas.contar("errores_foto")
             st.session_state.foto_procesada = False
+        finally:
+            st.session_state.trabajo_foto = None
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -309,40 +393,22 @@ def guardar_registro(nombre, interes, carrera, semestre, contacto, tiene_foto):
         "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
     
-    datos = []
-    archivo_json = "registros_sofa.json"
-    
-    # Crear archivo si no existe
-    if not os.path.exists(archivo_json):
-        with open(archivo_json, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
-    
-    # Cargar datos existentes
-    if os.path.exists(archivo_json):
-        try:
-            with open(archivo_json, 'r', encoding='utf-8') as f:
-                contenido = f.read().strip()
-                if contenido:
-                    datos = json.loads(contenido)
-                    # Si el archivo tenía un solo objeto (diccionario), convertirlo a lista
-                    if isinstance(datos, dict):
-                        datos = [datos]
-                else:
-                    datos = []
-        except json.JSONDecodeError as e:
-            st.error(f"Error leyendo el archivo JSON: {e}")
-            datos = []
-    
-    # Agregar nuevo registro
-    datos.append(registro)
-    
-    # Guardar datos actualizados
+    # Agregar el registro sin reescribir los anteriores. La clave depende del envío
+    # y de los datos: si el clic se reenvía tras un corte de red, no se duplica. El
+    # envío se renueva al guardar, porque el mismo kiosco atiende a muchos visitantes
+    # y dos pueden responder lo mismo
+    clave = clave_idempotencia(st.session_state.sesion_id, st.session_state.envio_id,
+                               nombre, interes, carrera, semestre, contacto)
+    registros = obtener_registros()
     try:
-        with open(archivo_json, 'w', encoding='utf-8') as f:
-            json.dump(datos, f, ensure_ascii=False, indent=2)
-        st.success("✅ Registro guardado correctamente en el archivo JSON")
+        with metricas.cronometro("guardar_registro"):
+            _, total = registros.agregar_sin_duplicar([(clave, registro)])
+        st.session_state.envio_id = uuid.uuid4().hex
+        metricas.contar("registros")
+        st.success("✅ Registro guardado correctamente")
     except Exception as e:
-        st.error(f"❌ Error guardando en archivo JSON: {e}")
+        st.error(f"❌ Error guardando el registro: {e}")
+        total = registros.total()
     
     # Mostrar resumen
     st.balloons()
@@ -357,7 +423,7 @@ def guardar_registro(nombre, interes, carrera, semestre, contacto, tiene_foto):
     
     # Mostrar estadísticas
     st.markdown("---")
-    st.info(f"📊 Total de registros guardados: {len(datos)}")
+    st.info(f"📊 Total de registros guardados: {total}")
     
     # Botón para ir a la descarga
     st.markdown("---")
@@ -0,0 +1,68 @@
+import streamlit as st
+import os
+import sys
+from datetime import datetime
+
+# Los módulos compartidos (carpeta sofa/) viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sofa.fotos import CARPETA_FOTOS
+from sofa.galeria import Atlas, dias_con_fotos
+
+# Pantalla grande del stand (presentación con las fotos del día):
+#   streamlit run pagina_basica/galeria.py --server.port 8503
+st.set_page_config(
+    page_title="SOFA 2025 - Galería",
+    page_icon="🖼️",
+    layout="wide"
+)
+
+@st.cache_resource
+def obtener_atlas(carpeta_dia):
+    """Un atlas por día, compartido por todas las pantallas (guarda el índice leído)"""
+    return Atlas(carpeta_dia)
+
+def main():
+    dias = dias_con_fotos(CARPETA_FOTOS)
+    hoy = datetime.now().strftime("%Y-%m-%d")
+    if hoy not in dias:
+        dias.insert(0, hoy)
+
+    with st.sidebar:
+        st.markdown("### ⚙️ Presentación")
+        dia = st.selectbox("Día", dias)
+        columnas = st.slider("Columnas", 3, 10, 6)
+        filas = st.slider("Filas", 2, 6, 4)
+        segundos = st.slider("Segundos por página", 3, 30, 8)
+        pausa = st.checkbox("⏸️ Pausar", key="pausa_galeria")
+
+    if "pagina_galeria" not in st.session_state:
+        st.session_state.pagina_galeria = 0
+
+    atlas = obtener_atlas(os.path.join(CARPETA_FOTOS, dia))
+
+    # Solo se vuelve a correr este fragmento cada `segundos`: el resto de la página
+    # (y el hilo del script) no se bloquea esperando la siguiente página
+    @st.fragment(run_every=None if pausa else segundos)
+    def presentacion():
+        # Las fotos nuevas ya entran al atlas al guardarse; aquí solo se suman las que falten
+        # (guardadas antes de activar la galería o copiadas a mano)
+        with st.spinner("Preparando la galería..."):
+            atlas.sincronizar()
+
+        mosaico, paginas, fotos = atlas.pagina(st.session_state.pagina_galeria, columnas, filas)
+
+        st.title(f"📸 SOFA 2025 - Universidad Santo Tomas · {fotos} fotos")
+        if mosaico is None:
+            st.info("Todavía no hay fotos de este día. ¡Pasa por el stand y tómate la tuya!")
+        else:
+            st.image(mosaico, use_container_width=True)
+            st.caption(f"Página {st.session_state.pagina_galeria % paginas + 1} de {paginas}")
+
+        if not pausa:
+            # la próxima corrida muestra la página siguiente
+            st.session_state.pagina_galeria = (st.session_state.pagina_galeria + 1) % max(paginas, 1)
+
+    presentacion()
+
+if __name__ == "__main__":
+    main()
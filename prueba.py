@@ -1,127 +1,35 @@
 # app.py
 import streamlit as st
-import cv2
-import numpy as np
 from PIL import Image
 import os
-from datetime import datetime
+import hashlib
 import io
-
-# Intentos de import para mejores opciones
-try:
-    import mediapipe as mp
-    MP_AVAILABLE = True
-except Exception:
-    MP_AVAILABLE = False
-
-try:
-    from rembg import remove as rembg_remove
-    REMBG_AVAILABLE = True
-except Exception:
-    REMBG_AVAILABLE = False
+import time
+import uuid
+
+from sofa import metricas
+from sofa.fotos import CARPETA_FOTOS, ruta_foto
+from sofa.galeria import agregar_a_galeria
+from sofa.memoria_fotos import MEMORIA_FOTOS
+from sofa.segmentacion import CACHE_MASCARAS, componer_con_alfa, componer_fondo
+from sofa.trabajos import ColaTrabajos, tarea_alfa, tarea_precargar
+from sofa.vista_previa import WEBRTC_AVAILABLE, mostrar_vista_previa
+
+@st.cache_resource
+def iniciar_metricas():
+    """Endpoint /metrics o volcado JSON (solo con SOFA_METRICAS=1)"""
+    return metricas.iniciar_exportacion()
 
 st.set_page_config(page_title="Foto con Fondo Mejorado", page_icon="🖼️", layout="centered")
 
+iniciar_metricas()
+
 # Carpetas
-os.makedirs("fotos_stand", exist_ok=True)
+os.makedirs(CARPETA_FOTOS, exist_ok=True)
 os.makedirs("assets", exist_ok=True)  # coloca aquí assets/fondo.png
 
 # -----------------------
-# UTIL: preprocesado para segmentación (reduce tamaño para speed)
-# -----------------------
-def _resize_for_seg(img_pil, max_side=512):
-    w, h = img_pil.size
-    scale = min(max_side / max(w, h), 1.0)
-    if scale < 1.0:
-        new_size = (int(w * scale), int(h * scale))
-        small = img_pil.resize(new_size, Image.LANCZOS)
-    else:
-        small = img_pil.copy()
-        scale = 1.0
-    return small, scale
-
-# -----------------------
-# Método 1: MediaPipe Selfie Segmentation
-# -----------------------
-def _segment_mediapipe(pil_img):
-    """Devuelve una máscara float32 (0..1) con la probabilidad de sujeto."""
-    if not MP_AVAILABLE:
-        raise RuntimeError("MediaPipe no disponible")
-    # trabajar con tamaño reducido para velocidad
-    small, scale = _resize_for_seg(pil_img, max_side=512)
-    img_np = np.array(small.convert("RGB"))
-    mp_selfie = mp.solutions.selfie_segmentation
-    with mp_selfie.SelfieSegmentation(model_selection=1) as seg:
-        results = seg.process(img_np)
-        if results.segmentation_mask is None:
-            return None, scale
-        mask_small = results.segmentation_mask.astype(np.float32)  # valores 0..1
-    # reescalar máscara al tamaño original
-    mask_full = cv2.resize(mask_small, pil_img.size, interpolation=cv2.INTER_LINEAR)
-    return mask_full, scale
-
-# -----------------------
-# Método 2: rembg (u2net) - devuelve máscara a partir de salida RGBA
-# -----------------------
-def _segment_rembg(pil_img):
-    if not REMBG_AVAILABLE:
-        raise RuntimeError("rembg no disponible")
-    buf = io.BytesIO()
-    pil_img.save(buf, format="PNG")
-    input_bytes = buf.getvalue()
-    out_bytes = rembg_remove(input_bytes)  # bytes PNG RGBA con alfa
-    out_img = Image.open(io.BytesIO(out_bytes)).convert("RGBA")
-    alpha = np.array(out_img.split()[-1]).astype(np.float32) / 255.0  # 0..1
-    return alpha, 1.0
-
-# -----------------------
-# Método 3: GrabCut mejorado (fallback)
-# -----------------------
-def _segment_grabcut(pil_img):
-    # Convertir a BGR
-    img_rgb = np.array(pil_img.convert("RGB"))
-    img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
-    H, W = img_bgr.shape[:2]
-
-    # Intentar detectar cara para rect inicial (mejor primer paso)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(30,30))
-    if len(faces) > 0:
-        # escoger la cara más grande
-        faces = sorted(faces, key=lambda r: r[2]*r[3], reverse=True)
-        x,y,w,h = faces[0]
-        # ampliar rect para incluir hombros
-        x0 = max(0, x - w//2)
-        y0 = max(0, y - h//2)
-        x1 = min(W-1, x + w + w//2)
-        y1 = min(H-1, y + h + h//2)
-        rect = (x0, y0, x1 - x0, y1 - y0)
-    else:
-        # fallback rect central
-        margin_w = int(W * 0.12)
-        margin_h = int(H * 0.10)
-        rect = (margin_w, margin_h, W - 2*margin_w, H - 2*margin_h)
-
-    mask_gc = np.zeros((H, W), np.uint8)
-    bgdModel = np.zeros((1, 65), np.float64)
-    fgdModel = np.zeros((1, 65), np.float64)
-    try:
-        cv2.grabCut(img_bgr, mask_gc, rect, bgdModel, fgdModel, 5, cv2.GC_INIT_WITH_RECT)
-    except Exception:
-        # Si falla, devolver máscara que incluye todo
-        return np.ones((H, W), dtype=np.float32), 1.0
-
-    mask2 = np.where((mask_gc == 2) | (mask_gc == 0), 0, 1).astype('uint8')
-    # suavizar bordes
-    mask_float = cv2.GaussianBlur(mask2.astype(np.float32), (21,21), 0)
-    # normalizar 0..1
-    if mask_float.max() > 0:
-        mask_float = mask_float / mask_float.max()
-    return mask_float.astype(np.float32), 1.0
-
-# -----------------------
-# Función combi: intenta mediapipe -> rembg -> grabcut
+# Aplicar fondo (la segmentación vive en sofa/segmentacion.py)
 # -----------------------
 def aplicar_fondo_mejorado(pil_img, fondo_path="assets/fondo.png", method="auto"):
     """
@@ -132,98 +40,146 @@ def aplicar_fondo_mejorado(pil_img, fondo_path="assets/fondo.png", method="auto"
         st.warning("No se encontró el fondo (assets/fondo.png). Se devolverá la imagen original.")
         return pil_img.convert("RGB")
 
-    # elegir método
-    prefer = method.lower()
-    mask = None
-    used = None
-    # MEDIAPIPE
-    if prefer in ("auto", "mediapipe") and MP_AVAILABLE:
-        try:
-            mask, _ = _segment_mediapipe(pil_img)
-            used = "mediapipe"
-        except Exception:
-            mask = None
-    # REMBG
-    if (mask is None) and (prefer in ("auto", "rembg") and REMBG_AVAILABLE):
-        try:
-            mask, _ = _segment_rembg(pil_img)
-            used = "rembg"
-        except Exception:
-            mask = None
-    # GRABCUT fallback
-    if mask is None:
-        try:
-            mask, _ = _segment_grabcut(pil_img)
-            used = "grabcut"
-        except Exception:
-            # como último recurso, máscara completa (no recorte)
-            W, H = pil_img.size
-            mask = np.ones((H, W), dtype=np.float32)
-            used = "none"
-
-    # Asegurar rango 0..1 y tamaño correcto
-    if mask is None:
-        W,H = pil_img.size
-        mask = np.ones((H, W), dtype=np.float32)
-    else:
-        # si la máscara tiene distinto tamaño, reasignar
-        if mask.shape != (pil_img.size[1], pil_img.size[0]):
-            mask = cv2.resize(mask, pil_img.size, interpolation=cv2.INTER_LINEAR)
-
-    # suavizamos y limitamos valores
-    mask = np.clip(mask, 0.0, 1.0)
-    # mejorar borde: aplicar un pequeño blur final y normalizar
-    mask = cv2.GaussianBlur(mask, (15,15), 0)
-    mask = np.clip(mask, 0.0, 1.0)
-
-    # cargar fondo y redimensionar
-    fondo = Image.open(fondo_path).convert("RGB").resize(pil_img.size, Image.LANCZOS)
-    fg = np.array(pil_img.convert("RGB")).astype(np.float32)
-    bg = np.array(fondo).astype(np.float32)
-
-    alpha = mask[..., None]  # H x W x 1
-    comp = (fg * alpha + bg * (1.0 - alpha)).astype(np.uint8)
-    final = Image.fromarray(comp)
+    final, used = componer_fondo(pil_img, fondo_path=fondo_path, method=method)
 
     # info para debugging
     st.info(f"Fondo aplicado con método: {used}")
     return final
 
+@st.cache_resource
+def obtener_cola_trabajos():
+    """Pool de procesos compartido por todas las sesiones (SOFA_TRABAJADORES procesos)"""
+    return ColaTrabajos()
+
+@st.cache_resource
+def precalentar_metodo(metodo):
+    """Cargar el modelo del método en los trabajadores, una vez por método y servidor"""
+    obtener_cola_trabajos().precalentar(tarea_precargar, metodo)
+    return True
+
 # -----------------------
 # Guardar foto
 # -----------------------
-def guardar_foto(imagen_pil, nombre_base="dragon"):
-    fecha = datetime.now().strftime("%Y%m%d_%H%M%S")
-    ruta_guardado = f"fotos_stand/{nombre_base}_{fecha}.png"
-    imagen_pil.save(ruta_guardado, quality=95)
+def guardar_foto(datos_png, nombre_base="dragon"):
+    # los bytes ya vienen codificados en PNG: se escriben sin volver a codificar
+    ruta_guardado = ruta_foto(nombre_base, ".png")
+    with open(ruta_guardado, "wb") as f:
+        f.write(datos_png)
+    agregar_a_galeria(ruta_guardado)
     return ruta_guardado
 
+def fijar_foto_final(imagen_pil):
+    """Codificar la composición una vez y dejarla en MEMORIA_FOTOS; en la sesión queda la clave"""
+    if st.session_state.foto_final is not None:
+        MEMORIA_FOTOS.eliminar(st.session_state.foto_final)
+        st.session_state.foto_final = None
+    if imagen_pil is None:
+        return
+    buffer = io.BytesIO()
+    imagen_pil.save(buffer, format="PNG")
+    st.session_state.foto_final = MEMORIA_FOTOS.guardar(st.session_state.sesion_id, buffer.getvalue())
+
 # -----------------------
 # INTERFAZ STREAMLIT
 # -----------------------
 st.title("📸 Stand: Aplicar Fondo Mejorado")
-st.markdown("Tómate una foto y la colocamos sobre `assets/fondo.png`. Opcional: instala `mediapipe` o `rembg` para mejores resultados.")
+st.markdown("Tómate una foto y la colocamos sobre `assets/fondo.png`. Opcional: instala `mediapipe` o `rembg` para mejores resultados y `streamlit-webrtc` para la vista previa en vivo.")
 
 # Opción para forzar método (útil para pruebas)
 metodo = st.selectbox("Método de segmentación (auto = intenta el mejor disponible)", ["auto", "mediapipe", "rembg", "grabcut"])
 
+# Fondo: cualquier imagen de assets/ (por defecto assets/fondo.png)
+fondos = sorted(f for f in os.listdir("assets") if f.lower().endswith((".png", ".jpg", ".jpeg")))
+if len(fondos) > 1:
+    fondo_elegido = st.selectbox("Fondo", fondos, index=fondos.index("fondo.png") if "fondo.png" in fondos else 0)
+else:
+    fondo_elegido = fondos[0] if fondos else "fondo.png"
+fondo_path = os.path.join("assets", fondo_elegido)
+
+# Vista previa en vivo (opcional: pip install streamlit-webrtc)
+if WEBRTC_AVAILABLE and os.path.exists(fondo_path):
+    if st.checkbox("👀 Vista previa en vivo con el fondo"):
+        mostrar_vista_previa(fondo_path, metodo=metodo)
+
 # Camera
 img_file = st.camera_input("Toma tu foto aquí")
 
+if "trabajo_clave" not in st.session_state:
+    st.session_state.trabajo_clave = None
+if "trabajo_id" not in st.session_state:
+    st.session_state.trabajo_id = None
+if "trabajo_mascara" not in st.session_state:  # (foto_hash, metodo) que calcula trabajo_id
+    st.session_state.trabajo_mascara = None
+if "foto_final" not in st.session_state:  # clave en MEMORIA_FOTOS de la composición
+    st.session_state.foto_final = None
+if "sesion_id" not in st.session_state:
+    st.session_state.sesion_id = uuid.uuid4().hex
+
 if img_file is not None:
     # abrir imagen
     image = Image.open(img_file)
-    st.image(image, caption="Original", use_container_width=True)
-
-    # Aplicar fondo mejorado
-    with st.spinner("Aplicando fondo..."):
+    foto_bytes = img_file.getvalue()
+    # los bytes de la cámara se muestran tal cual, sin decodificar y recodificar
+    st.image(foto_bytes, caption="Original", use_container_width=True)
+
+    # La segmentación corre en el pool de procesos una vez por (captura, método);
+    # la máscara queda en caché, así cambiar de fondo solo repite la mezcla
+    cola = obtener_cola_trabajos()
+    foto_hash = hashlib.sha1(foto_bytes).hexdigest()
+    mascara = (foto_hash, metodo)
+    clave = (foto_hash, metodo, fondo_path,
+             os.path.getmtime(fondo_path) if os.path.exists(fondo_path) else None)
+    if not os.path.exists(fondo_path):
+        fijar_foto_final(aplicar_fondo_mejorado(image, fondo_path=fondo_path, method=metodo))
+        st.session_state.trabajo_clave = clave
+    elif st.session_state.trabajo_clave != clave:
+        st.session_state.trabajo_clave = clave
+        fijar_foto_final(None)
+        if st.session_state.trabajo_id and st.session_state.trabajo_mascara != mascara:
+            # cambió la foto o el método: el trabajo en curso ya no sirve
+            cola.olvidar(st.session_state.trabajo_id)
+            st.session_state.trabajo_id = None
+        en_cache = CACHE_MASCARAS.get(mascara)
+        if en_cache is not None:
+            alfa, used = en_cache
+            fijar_foto_final(componer_con_alfa(image, alfa, used, fondo_path))
+        elif not st.session_state.trabajo_id:
+            # si solo cambió el fondo, se sigue esperando la misma máscara
+            st.session_state.trabajo_id = cola.enviar(tarea_alfa, foto_bytes, metodo)
+            st.session_state.trabajo_mascara = mascara
+
+    if st.session_state.trabajo_id:
+        if cola.estado(st.session_state.trabajo_id) == "pendiente":
+            with st.spinner("Aplicando fondo..."):
+                time.sleep(0.3)
+            st.rerun()
         try:
-            final_img = aplicar_fondo_mejorado(image, fondo_path="assets/fondo.png", method=metodo)
-            st.image(final_img, caption="Resultado con fondo aplicado", use_container_width=True)
-            if st.button("Guardar foto final"):
-                ruta = guardar_foto(final_img, nombre_base="dragon")
-                st.success(f"Guardado en {ruta}")
+            alfa, used = cola.resultado(st.session_state.trabajo_id)
+            # la máscara se guarda con la clave del trabajo, no con la del método elegido ahora
+            CACHE_MASCARAS.put(st.session_state.trabajo_mascara, (alfa, used), alfa.nbytes)
+            if st.session_state.trabajo_mascara == mascara:
+                fijar_foto_final(componer_con_alfa(image, alfa, used, fondo_path))
+                st.info(f"Fondo aplicado con método: {used}")
         except Exception as e:
             st.error(f"Error aplicando fondo: {e}")
+            st.session_state.trabajo_clave = None
+        finally:
+            st.session_state.trabajo_id = None
+            st.session_state.trabajo_mascara = None
+
+    final_img = MEMORIA_FOTOS.leer(st.session_state.foto_final) if st.session_state.foto_final else None
+    if final_img is None and st.session_state.foto_final is not None:
+        # descartada por inactividad: se vuelve a componer en el próximo rerun
+        st.session_state.foto_final = None
+        st.session_state.trabajo_clave = None
+        st.rerun()
+    if final_img is not None:
+        st.image(final_img, caption="Resultado con fondo aplicado", use_container_width=True)
+        if st.button("Guardar foto final"):
+            ruta = guardar_foto(final_img, nombre_base="dragon")
+            st.success(f"Guardado en {ruta}")
 else:
     st.info("Activa tu cámara y tómate una foto para ver el resultado.")
+
+# Con la página ya pintada, cargar en segundo plano el modelo del método elegido
+precalentar_metodo(metodo)
@@ -0,0 +1 @@
+"""Módulos compartidos por las aplicaciones del stand SOFA."""
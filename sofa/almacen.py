@@ -0,0 +1,141 @@
+"""Almacén de las fotos para correr varios servidores de la app a la vez.
+
+Cada servidor guarda y muestra las fotos desde su carpeta de trabajo
+(SOFA_FOTOS, por defecto fotos_stand/). Hay tres modos:
+
+- carpeta local: un solo servidor (o varios procesos en la misma máquina);
+- carpeta compartida: SOFA_FOTOS apunta a un montaje NFS/SMB común; las
+  escrituras son atómicas (archivo temporal + rename) y la retención usa un
+  bloqueo en la misma carpeta;
+- objeto S3 (SOFA_FOTOS_REMOTO=s3://bucket/prefijo, con SOFA_S3_ENDPOINT para
+  MinIO o moto): cada foto guardada se sube al bucket y, si la sesión cae en
+  otro servidor, la foto se baja a su carpeta de trabajo la primera vez que
+  se pide.
+"""
+import functools
+import importlib.util
+import os
+import time
+
+from .fotos import CARPETA_FOTOS, limpiar_nombre, ruta_miniatura
+
+# boto3 tarda cientos de ms en importarse: solo se importa al crear el cliente S3
+BOTO3_AVAILABLE = importlib.util.find_spec("boto3") is not None
+
+FOTOS_REMOTO = os.environ.get("SOFA_FOTOS_REMOTO", "")
+S3_ENDPOINT = os.environ.get("SOFA_S3_ENDPOINT") or None
+# Días hacia atrás en los que se busca la foto de un visitante
+DIAS_BUSQUEDA = int(os.environ.get("SOFA_DIAS_BUSQUEDA", "2"))
+
+
+def separar_url_s3(url):
+    """s3://bucket/prefijo -> ("bucket", "prefijo/")"""
+    if not url.startswith("s3://"):
+        raise ValueError(f"URL S3 inválida: {url}")
+    bucket, _, prefijo = url[len("s3://"):].partition("/")
+    prefijo = prefijo.strip("/")
+    return bucket, prefijo + "/" if prefijo else ""
+
+
+def cliente_s3(endpoint=None):
+    """Cliente boto3 (credenciales por las variables AWS_* de siempre)"""
+    if not BOTO3_AVAILABLE:
+        raise RuntimeError("boto3 no disponible: pip install boto3")
+    import boto3
+    return boto3.client("s3", endpoint_url=endpoint or S3_ENDPOINT)
+
+
+class AlmacenLocal:
+    """Las fotos ya están en la carpeta (local o compartida): no hay nada que sincronizar"""
+
+    def __init__(self, carpeta=None):
+        self.carpeta = carpeta or CARPETA_FOTOS
+
+    def publicar(self, ruta):
+        return ruta
+
+    def traer_ultima(self, nombre):
+        return None
+
+    def eliminar(self, ruta):
+        pass
+
+
+class AlmacenS3:
+    """Copia de las fotos (y sus miniaturas) en un bucket S3 compatible"""
+
+    def __init__(self, url, carpeta=None, endpoint=None, dias=None):
+        self.bucket, self.prefijo = separar_url_s3(url)
+        self.carpeta = carpeta or CARPETA_FOTOS
+        self.dias = DIAS_BUSQUEDA if dias is None else dias
+        self._s3 = cliente_s3(endpoint)
+
+    def _clave(self, ruta):
+        relativa = os.path.relpath(ruta, self.carpeta)
+        return self.prefijo + relativa.replace(os.sep, "/")
+
+    def _ruta(self, clave):
+        return os.path.join(self.carpeta, *clave[len(self.prefijo):].split("/"))
+
+    def publicar(self, ruta):
+        """Subir una foto recién guardada y su miniatura. Devuelve `ruta`."""
+        mini = ruta_miniatura(ruta)
+        if os.path.exists(mini):
+            self._s3.upload_file(mini, self.bucket, self._clave(mini))
+        self._s3.upload_file(ruta, self.bucket, self._clave(ruta))
+        return ruta
+
+    def traer_ultima(self, nombre):
+        """Bajar a la carpeta de trabajo la foto más reciente de `nombre` (guardada en otro servidor)"""
+        nombre_limpio = limpiar_nombre(nombre)
+        if not nombre_limpio:
+            return None
+        hoy = time.time()
+        for atras in range(self.dias):
+            dia = time.strftime("%Y-%m-%d", time.localtime(hoy - atras * 86400))
+            claves = []
+            paginador = self._s3.get_paginator("list_objects_v2")
+            for pagina in paginador.paginate(Bucket=self.bucket,
+                                             Prefix=f"{self.prefijo}{dia}/{nombre_limpio}_"):
+                for objeto in pagina.get("Contents", []):
+                    base = os.path.splitext(objeto["Key"].rsplit("/", 1)[-1])[0]
+                    # "Ana_..." también es prefijo de "Ana_Maria_...": comparar el nombre entero
+                    if base.rsplit("_", 2)[0] == nombre_limpio:
+                        claves.append(objeto["Key"])
+            if claves:
+                return self._bajar(max(claves))
+        return None
+
+    def _bajar(self, clave):
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        mini = ruta_miniatura(ruta)
+        try:
+            os.makedirs(os.path.dirname(mini), exist_ok=True)
+            self._s3.download_file(self.bucket, self._clave(mini), mini + ".tmp")
+            os.replace(mini + ".tmp", mini)
+        except Exception:
+            pass  # sin miniatura se muestra la foto completa
+        self._s3.download_file(self.bucket, clave, ruta + ".tmp")
+        os.replace(ruta + ".tmp", ruta)
+        return ruta
+
+    def eliminar(self, ruta):
+        """Borrar del bucket una foto y su miniatura"""
+        self._s3.delete_objects(Bucket=self.bucket, Delete={"Objects": [
+            {"Key": self._clave(ruta)}, {"Key": self._clave(ruta_miniatura(ruta))}]})
+
+
+@functools.lru_cache(maxsize=None)
+def abrir_almacen(remoto=None, carpeta=None):
+    """AlmacenS3 si hay SOFA_FOTOS_REMOTO (o `remoto`) s3://..., si no AlmacenLocal; uno por proceso"""
+    remoto = FOTOS_REMOTO if remoto is None else remoto
+    if remoto:
+        return AlmacenS3(remoto, carpeta=carpeta)
+    return AlmacenLocal(carpeta)
+
+
+def compartida():
+    """True si otros servidores escriben en la misma carpeta o bucket"""
+    return bool(FOTOS_REMOTO) or os.environ.get("SOFA_FOTOS_COMPARTIDA", "0") == "1"
+
@@ -0,0 +1,35 @@
+"""Bloqueo de archivos entre procesos (fcntl en Linux/macOS, msvcrt en Windows)."""
+import contextlib
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def bloqueo_exclusivo(ruta_bloqueo):
+    """Tomar un bloqueo exclusivo sobre `ruta_bloqueo` mientras dura el bloque with"""
+    with open(ruta_bloqueo, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            # msvcrt bloquea rangos de bytes; el primer byte sirve de testigo
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,49 @@
+"""Caché LRU acotada por memoria (bytes) y segura entre hilos."""
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Guarda valores con su tamaño en bytes y, cuando la suma pasa de
+    `max_bytes`, descarta primero los usados hace más tiempo.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._datos = OrderedDict()  # clave -> (valor, tamaño)
+        self._lock = threading.Lock()
+
+    def get(self, clave, defecto=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return defecto
+            self._datos.move_to_end(clave)
+            return entrada[0]
+
+    def put(self, clave, valor, tamano):
+        """Guardar `valor`; si por sí solo no cabe en la caché, no se guarda"""
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[1]
+            self._datos[clave] = (valor, tamano)
+            self.bytes += tamano
+            while self.bytes > self.max_bytes:
+                _, (_, tam) = self._datos.popitem(last=False)
+                self.bytes -= tam
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __contains__(self, clave):
+        return clave in self._datos
@@ -0,0 +1,112 @@
+"""Codificación de fotos para descargar y mostrar."""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from .fotos import ruta_miniatura
+
+# formato -> (nombre en PIL, tipo MIME, extensión)
+FORMATOS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "png": ("PNG", "image/png", "png"),
+}
+
+FORMATO_DESCARGA = os.environ.get("SOFA_FORMATO_DESCARGA", "jpeg").lower()
+
+# Foto maestra que se guarda en fotos_stand/ y miniatura que se muestra en pantalla
+FORMATO_FOTO = os.environ.get("SOFA_FORMATO_FOTO", "jpeg").lower()
+CALIDAD_FOTO = int(os.environ.get("SOFA_CALIDAD_FOTO", "90"))
+LADO_MINIATURA = int(os.environ.get("SOFA_LADO_MINIATURA", "480"))
+CALIDAD_MINIATURA = int(os.environ.get("SOFA_CALIDAD_MINIATURA", "75"))
+
+
+def es_jpeg(datos):
+    return datos[:3] == b"\xff\xd8\xff"
+
+
+def preparar_descarga(foto_bytes, formato=None):
+    """
+    Devuelve (bytes, mime, extension) de la foto en el formato pedido.
+    Si la captura ya es JPEG y se pide JPEG, se entrega tal cual sin recodificar.
+    """
+    formato = (formato or FORMATO_DESCARGA).lower()
+    nombre_pil, mime, extension = FORMATOS.get(formato, FORMATOS["jpeg"])
+    if nombre_pil == "JPEG" and es_jpeg(foto_bytes):
+        return foto_bytes, mime, extension
+    imagen = Image.open(io.BytesIO(foto_bytes))
+    if imagen.mode != "RGB":
+        imagen = imagen.convert("RGB")
+    buf = io.BytesIO()
+    if nombre_pil == "WEBP":
+        imagen.save(buf, format="WEBP", quality=90, method=4)
+    elif nombre_pil == "JPEG":
+        imagen.save(buf, format="JPEG", quality=95)
+    else:
+        imagen.save(buf, format="PNG")
+    return buf.getvalue(), mime, extension
+
+
+def extension_foto(formato=None):
+    """Extensión (con punto) de la foto maestra según el formato configurado"""
+    return "." + FORMATOS.get((formato or FORMATO_FOTO).lower(), FORMATOS["jpeg"])[2]
+
+
+def mime_de(ruta):
+    """Tipo MIME según la extensión del archivo"""
+    extension = os.path.splitext(ruta)[1].lower().lstrip(".")
+    for _, mime, ext in FORMATOS.values():
+        if ext == extension:
+            return mime
+    return "image/jpeg"
+
+
+def codificar(imagen, formato="jpeg", calidad=90, progresivo=True, optimizar=True):
+    """
+    Codifica la imagen sin metadatos (EXIF, GPS, perfil ICC): primero aplica la
+    orientación EXIF a los píxeles y luego guarda una copia limpia.
+    JPEG sale progresivo y con tablas Huffman optimizadas.
+    """
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode != "RGB":
+        imagen = imagen.convert("RGB")
+    limpia = Image.frombytes("RGB", imagen.size, imagen.tobytes())
+    buf = io.BytesIO()
+    if formato.lower() == "webp":
+        limpia.save(buf, format="WEBP", quality=calidad, method=4)
+    else:
+        limpia.save(buf, format="JPEG", quality=calidad, progressive=progresivo,
+                    optimize=optimizar)
+    return buf.getvalue()
+
+
+def miniatura(imagen, lado=None):
+    """Copia reducida (lado mayor `lado`) para mostrar en pantalla"""
+    lado = lado or LADO_MINIATURA
+    copia = imagen.copy()
+    copia.thumbnail((lado, lado), Image.LANCZOS)
+    return copia
+
+
+def guardar_foto_con_miniatura(foto_bytes, ruta, calidad=None, formato=None):
+    """
+    Guarda la foto maestra en `ruta` y su miniatura en `ruta_miniatura(ruta)`.
+    Se escribe primero la miniatura para que, cuando la foto aparezca en la
+    carpeta, su vista previa ya exista. Cada archivo se escribe aparte y se
+    renombra, así otro servidor que lea la carpeta compartida nunca ve una
+    foto a medias. Devuelve `ruta`.
+    """
+    imagen = ImageOps.exif_transpose(Image.open(io.BytesIO(foto_bytes)))
+    mini = ruta_miniatura(ruta)
+    os.makedirs(os.path.dirname(mini), exist_ok=True)
+    _escribir_atomico(mini, codificar(miniatura(imagen), "jpeg", CALIDAD_MINIATURA))
+    _escribir_atomico(ruta, codificar(imagen, formato or FORMATO_FOTO, calidad or CALIDAD_FOTO))
+    return ruta
+
+
+def _escribir_atomico(ruta, datos):
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
@@ -0,0 +1,77 @@
+"""Agregación incremental de los registros para el panel del stand."""
+import threading
+from collections import Counter
+
+
+def _campo(registro, *claves):
+    """Primer valor presente entre las claves (los dos formularios usan nombres distintos)"""
+    for clave in claves:
+        valor = registro.get(clave)
+        if valor:
+            return valor
+    return "Sin dato"
+
+
+def _hora(fecha):
+    """Hora del día de "AAAA-MM-DD HH:MM:SS", o None si la fecha no tiene ese formato"""
+    if not isinstance(fecha, str) or len(fecha) < 13:
+        return None
+    try:
+        hora = int(fecha[11:13])
+    except ValueError:
+        return None
+    return hora if 0 <= hora < 24 else None
+
+
+class Estadisticas:
+    """
+    Contadores que se actualizan solo con los registros nuevos: cada
+    `actualizar()` pide al almacén lo agregado desde el último cursor, así el
+    panel puede refrescarse cada pocos segundos sin releer el histórico.
+    """
+
+    def __init__(self, registros):
+        self.registros = registros
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self.total = 0
+        self.por_interes = Counter()
+        self.por_carrera = Counter()
+        self.por_periodo = Counter()
+        self.por_hora = Counter()
+        self.con_foto = 0
+        self.con_dato_foto = 0
+
+    def _sumar(self, registro):
+        self.total += 1
+        self.por_interes[_campo(registro, "interes_universidad", "interes_uni")] += 1
+        self.por_carrera[_campo(registro, "carrera_interes", "carrera")] += 1
+        self.por_periodo[_campo(registro, "semestre_ingreso", "periodo")] += 1
+        hora = _hora(registro.get("fecha_registro"))
+        if hora is not None:
+            self.por_hora[hora] += 1
+        # SQLite devuelve tiene_foto=None en los registros del formulario que no lo pregunta
+        if registro.get("tiene_foto") is not None:
+            self.con_dato_foto += 1
+            if registro["tiene_foto"] == "Sí":
+                self.con_foto += 1
+
+    def actualizar(self):
+        """Sumar los registros nuevos y devolver cuántos llegaron"""
+        with self._lock:
+            nuevos, self._cursor = self.registros.leer_desde(self._cursor)
+            for registro in nuevos:
+                self._sumar(registro)
+            return len(nuevos)
+
+    def resumen(self):
+        """Copia de los contadores actuales"""
+        with self._lock:
+            return {
+                "total": self.total,
+                "por_interes": dict(self.por_interes),
+                "por_carrera": dict(self.por_carrera),
+                "por_periodo": dict(self.por_periodo),
+                "por_hora": {h: self.por_hora.get(h, 0) for h in range(24)},
+                "tasa_foto": self.con_foto / self.con_dato_foto if self.con_dato_foto else None,
+            }
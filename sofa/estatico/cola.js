@@ -0,0 +1,82 @@
+// Cola de registros sin conexión: IndexedDB en el navegador -> POST /api/registros/lote.
+// La usan la página del formulario y el service worker (importScripts), así
+// que no toca el DOM.
+
+const BD_NOMBRE = "sofa";
+const BD_TIENDA = "pendientes";
+const TAM_LOTE = 100;
+
+function abrirBD() {
+  return new Promise((resolver, rechazar) => {
+    const pedido = indexedDB.open(BD_NOMBRE, 1);
+    pedido.onupgradeneeded = () => pedido.result.createObjectStore(BD_TIENDA, { keyPath: "clave" });
+    pedido.onsuccess = () => resolver(pedido.result);
+    pedido.onerror = () => rechazar(pedido.error);
+  });
+}
+
+async function transaccion(modo, accion) {
+  const bd = await abrirBD();
+  return new Promise((resolver, rechazar) => {
+    const tx = bd.transaction(BD_TIENDA, modo);
+    const resultado = accion(tx.objectStore(BD_TIENDA));
+    tx.oncomplete = () => resolver(resultado && "result" in resultado ? resultado.result : undefined);
+    tx.onerror = () => rechazar(tx.error);
+  });
+}
+
+function nuevaClave() {
+  if (self.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2, 12);
+}
+
+function fechaLocal(d = new Date()) {
+  const dos = (n) => String(n).padStart(2, "0");
+  return `${d.getFullYear()}-${dos(d.getMonth() + 1)}-${dos(d.getDate())} ` +
+         `${dos(d.getHours())}:${dos(d.getMinutes())}:${dos(d.getSeconds())}`;
+}
+
+// Guardar un registro en la cola; la clave viaja con cada reintento
+async function encolarRegistro(origen, datos) {
+  const entrada = { clave: nuevaClave(), origen, datos, creado: Date.now() };
+  await transaccion("readwrite", (tienda) => tienda.put(entrada));
+  return entrada.clave;
+}
+
+async function contarPendientes() {
+  return transaccion("readonly", (tienda) => tienda.count());
+}
+
+let enviando = null;
+
+// Enviar todo lo pendiente por lotes de un mismo origen. Se borran solo las claves
+// que el servidor confirmó o rechazó por inválidas; el resto queda en la cola.
+// Si no hay red o el servidor falla, lo pendiente queda para el próximo intento.
+function enviarPendientes() {
+  if (!enviando) {
+    enviando = (async () => {
+      const pendientes = await transaccion("readonly", (tienda) => tienda.getAll());
+      const porOrigen = {};
+      for (const p of pendientes) (porOrigen[p.origen] = porOrigen[p.origen] || []).push(p);
+      let enviados = 0;
+      for (const [origen, lista] of Object.entries(porOrigen)) {
+        for (let i = 0; i < lista.length; i += TAM_LOTE) {
+          const lote = lista.slice(i, i + TAM_LOTE);
+          const respuesta = await fetch("/api/registros/lote", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ origen, registros: lote.map(({ clave, datos }) => ({ clave, datos })) }),
+          });
+          if (!respuesta.ok) throw new Error(`HTTP ${respuesta.status}: ${await respuesta.text()}`);
+          const { confirmadas, rechazadas = [] } = await respuesta.json();
+          for (const r of rechazadas) console.warn("Registro rechazado", r.clave, r.motivo);
+          const borrar = confirmadas.concat(rechazadas.map((r) => r.clave).filter(Boolean));
+          await transaccion("readwrite", (t) => borrar.forEach((c) => t.delete(c)));
+          enviados += confirmadas.length;
+        }
+      }
+      return enviados;
+    })().finally(() => { enviando = null; });
+  }
+  return enviando;
+}
@@ -0,0 +1,41 @@
+// Service worker: sirve el formulario sin conexión y vacía la cola con Background Sync.
+importScripts("/cola.js");
+
+const CACHE = "sofa-registro-v1";
+const ARCHIVOS = ["/", "/cola.js", "/manifest.json"];
+
+self.addEventListener("install", (evento) => {
+  evento.waitUntil(caches.open(CACHE).then((c) => c.addAll(ARCHIVOS)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", (evento) => {
+  evento.waitUntil((async () => {
+    for (const nombre of await caches.keys()) if (nombre !== CACHE) await caches.delete(nombre);
+    await self.clients.claim();
+  })());
+});
+
+self.addEventListener("fetch", (evento) => {
+  const url = new URL(evento.request.url);
+  if (evento.request.method !== "GET" || url.origin !== self.location.origin) return;
+  // Red primero (para tomar cambios del formulario); sin red, la copia guardada
+  evento.respondWith((async () => {
+    const clave = url.pathname === "/registro.html" ? "/" : url.pathname;
+    try {
+      const respuesta = await fetch(evento.request);
+      if (respuesta.ok && ARCHIVOS.includes(clave)) {
+        const copia = respuesta.clone();
+        caches.open(CACHE).then((c) => c.put(clave, copia));
+      }
+      return respuesta;
+    } catch (e) {
+      const guardada = await caches.match(clave);
+      if (guardada) return guardada;
+      throw e;
+    }
+  })());
+});
+
+self.addEventListener("sync", (evento) => {
+  if (evento.tag === "enviar-registros") evento.waitUntil(enviarPendientes());
+});
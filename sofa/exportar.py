@@ -0,0 +1,137 @@
+"""Exportación de registros a CSV, Parquet o XLSX por lotes (memoria constante).
+
+    python -m sofa.exportar leads.csv --desde 2025-10-01 --hasta 2025-10-05 --deduplicar
+    python -m sofa.exportar leads.xlsx --interes "Sí" "Sí, definitivamente"
+"""
+import argparse
+import csv
+import os
+
+from .registros import COLUMNAS_EXPORTACION, abrir_registros
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except Exception:
+    PARQUET_AVAILABLE = False
+
+try:
+    from openpyxl import Workbook
+    XLSX_AVAILABLE = True
+except Exception:
+    XLSX_AVAILABLE = False
+
+FORMATOS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def formatos_disponibles():
+    return [f for f, ok in (("csv", True), ("parquet", PARQUET_AVAILABLE), ("xlsx", XLSX_AVAILABLE)) if ok]
+
+
+def _lotes(filas, tamano):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _csv(filas, destino):
+    # utf-8-sig para que Excel reconozca las tildes al abrir el CSV
+    with open(destino, "w", encoding="utf-8-sig", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUMNAS_EXPORTACION)
+        escritor.writeheader()
+        n = 0
+        for fila in filas:
+            escritor.writerow(fila)
+            n += 1
+    return n
+
+
+def _parquet(filas, destino, lote):
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow no disponible (pip install pyarrow)")
+    esquema = pa.schema([(c, pa.string()) for c in COLUMNAS_EXPORTACION])
+    n = 0
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        # un row group por lote: nunca hay más de `lote` filas en memoria
+        for bloque in _lotes(filas, lote):
+            columnas = {c: [None if f[c] is None else str(f[c]) for f in bloque]
+                        for c in COLUMNAS_EXPORTACION}
+            escritor.write_table(pa.Table.from_pydict(columnas, schema=esquema))
+            n += len(bloque)
+        if n == 0:
+            escritor.write_table(esquema.empty_table())
+    return n
+
+
+def _xlsx(filas, destino):
+    if not XLSX_AVAILABLE:
+        raise RuntimeError("openpyxl no disponible (pip install openpyxl)")
+    # write_only: openpyxl escribe las filas a un temporal en vez de guardarlas en memoria
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("Registros")
+    hoja.append(COLUMNAS_EXPORTACION)
+    n = 0
+    for fila in filas:
+        hoja.append([fila[c] for c in COLUMNAS_EXPORTACION])
+        n += 1
+    libro.save(destino)
+    return n
+
+
+def exportar(registros, destino, formato=None, lote=1000, **filtros):
+    """
+    Escribir los registros filtrados en `destino` y devolver cuántos se exportaron.
+    `formato` se deduce de la extensión si no se indica. Filtros: desde, hasta
+    (AAAA-MM-DD), interes, carrera (listas de valores) y deduplicar.
+    """
+    formato = (formato or os.path.splitext(destino)[1].lstrip(".")).lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    filas = registros.consultar(**filtros)
+    temporal = destino + ".tmp"
+    try:
+        if formato == "csv":
+            n = _csv(filas, temporal)
+        elif formato == "parquet":
+            n = _parquet(filas, temporal, lote)
+        else:
+            n = _xlsx(filas, temporal)
+        os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar registros a CSV, Parquet o XLSX")
+    parser.add_argument("destino", help="archivo de salida (.csv, .parquet o .xlsx)")
+    parser.add_argument("--registros", default=os.environ.get("SOFA_REGISTROS", "registros_sofa.db"))
+    parser.add_argument("--formato", choices=list(FORMATOS))
+    parser.add_argument("--desde", help="fecha inicial AAAA-MM-DD (incluida)")
+    parser.add_argument("--hasta", help="fecha final AAAA-MM-DD (incluida)")
+    parser.add_argument("--interes", nargs="+", help="niveles de interés a incluir")
+    parser.add_argument("--carrera", nargs="+", help="carreras / áreas a incluir")
+    parser.add_argument("--deduplicar", action="store_true",
+                        help="dejar solo el registro más reciente por contacto")
+    parser.add_argument("--lote", type=int, default=1000)
+    args = parser.parse_args()
+
+    n = exportar(abrir_registros(args.registros), args.destino, formato=args.formato,
+                 lote=args.lote, desde=args.desde, hasta=args.hasta, interes=args.interes,
+                 carrera=args.carrera, deduplicar=args.deduplicar)
+    print(f"Exportados {n} registros a {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Ubicación e índice en memoria de las fotos guardadas en fotos_stand/.
+
+Las fotos se reparten en una subcarpeta por día (fotos_stand/AAAA-MM-DD/)
+para que ningún directorio crezca sin límite y para que la retención pueda
+borrar o archivar días completos.
+"""
+import bisect
+import os
+import threading
+from datetime import datetime
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except Exception:
+    WATCHDOG_AVAILABLE = False
+
+
+def limpiar_nombre(nombre):
+    """Dejar solo letras, números, espacios, guiones y guiones bajos"""
+    return "".join(c for c in nombre if c.isalnum() or c in (' ', '-', '_')).rstrip()
+
+
+# Carpeta de trabajo de las fotos; en modo multi-kiosco puede ser una carpeta
+# compartida (NFS/SMB) montada en todos los servidores
+CARPETA_FOTOS = os.environ.get("SOFA_FOTOS", "fotos_stand")
+
+# Subcarpetas de fotos_stand/ que no contienen fotos de visitantes
+CARPETAS_IGNORADAS = {"miniaturas"}
+
+
+def ruta_foto(nombre, extension=".jpg", carpeta=None, momento=None):
+    """fotos_stand/AAAA-MM-DD/{nombre limpio}_{AAAAMMDD}_{HHMMSS}{extension}; crea la subcarpeta"""
+    momento = momento or datetime.now()
+    subcarpeta = os.path.join(carpeta or CARPETA_FOTOS, momento.strftime("%Y-%m-%d"))
+    os.makedirs(subcarpeta, exist_ok=True)
+    return os.path.join(subcarpeta, f"{limpiar_nombre(nombre)}_{momento.strftime('%Y%m%d_%H%M%S')}{extension}")
+
+
+def ruta_miniatura(ruta_foto):
+    """fotos_stand/AAAA-MM-DD/x.jpg -> fotos_stand/AAAA-MM-DD/miniaturas/x.jpg (siempre JPEG)"""
+    carpeta, archivo = os.path.split(ruta_foto)
+    return os.path.join(carpeta, "miniaturas", os.path.splitext(archivo)[0] + ".jpg")
+
+
+def recorrer_fotos(carpeta=None):
+    """Entradas (os.DirEntry) de todas las fotos: las sueltas de versiones anteriores y las de cada día"""
+    carpeta = carpeta or CARPETA_FOTOS
+    if not os.path.isdir(carpeta):
+        return
+    with os.scandir(carpeta) as entradas:
+        for entrada in entradas:
+            if entrada.is_file():
+                yield entrada
+            elif entrada.is_dir() and entrada.name not in CARPETAS_IGNORADAS:
+                with os.scandir(entrada.path) as del_dia:
+                    for foto in del_dia:
+                        if foto.is_file():
+                            yield foto
+
+
+class IndiceFotos:
+    """Índice nombre limpio -> fotos [(mtime, ruta)] ordenadas de la más vieja a la más nueva.
+
+    Se construye una sola vez recorriendo la carpeta y luego se mantiene con
+    `registrar` / `eliminar` (y opcionalmente con watchdog), así las búsquedas
+    por nombre no vuelven a listar el directorio. Con `compartida` (carpeta
+    escrita también por otros servidores) una búsqueda sin resultado revisa
+    las carpetas de los últimos días antes de responder None.
+    """
+
+    def __init__(self, carpeta=None, extensiones=(".jpg", ".webp"), compartida=False, dias=2):
+        self.carpeta = carpeta or CARPETA_FOTOS
+        self.compartida = compartida
+        self.dias = dias
+        self._carpeta_abs = os.path.abspath(self.carpeta)
+        self.extensiones = tuple(extensiones)
+        self._fotos = {}
+        self._lock = threading.RLock()
+        self._observador = None
+        self.reconstruir()
+
+    def _nombre_de(self, ruta):
+        """Extraer el nombre limpio de `{nombre}_{AAAAMMDD}_{HHMMSS}.jpg`"""
+        base, extension = os.path.splitext(os.path.basename(ruta))
+        if extension not in self.extensiones:
+            return None
+        partes = base.rsplit("_", 2)
+        if len(partes) != 3:
+            return None
+        return partes[0]
+
+    def reconstruir(self):
+        """Recorrer la carpeta una vez y armar el índice desde cero"""
+        fotos = {}
+        for entrada in recorrer_fotos(self.carpeta):
+            nombre = self._nombre_de(entrada.name)
+            if nombre is not None:
+                fotos.setdefault(nombre, []).append((entrada.stat().st_mtime, entrada.path))
+        for lista in fotos.values():
+            lista.sort()
+        with self._lock:
+            self._fotos = fotos
+
+    def _normalizar(self, ruta):
+        """Rutas absolutas (watchdog) -> relativas a la carpeta, como las que arma la app"""
+        if os.path.isabs(ruta):
+            return os.path.join(self.carpeta, os.path.relpath(ruta, self._carpeta_abs))
+        return os.path.normpath(ruta)
+
+    def registrar(self, ruta, mtime=None):
+        """Agregar una foto recién guardada"""
+        nombre = self._nombre_de(ruta)
+        if nombre is None:
+            return
+        ruta = self._normalizar(ruta)
+        if mtime is None:
+            try:
+                mtime = os.path.getmtime(ruta)
+            except OSError:
+                return
+        with self._lock:
+            lista = self._fotos.setdefault(nombre, [])
+            if not any(r == ruta for _, r in lista):
+                bisect.insort(lista, (mtime, ruta))
+
+    def eliminar(self, ruta):
+        """Quitar una foto del índice (no borra el archivo)"""
+        nombre = self._nombre_de(ruta)
+        if nombre is None:
+            return
+        ruta = self._normalizar(ruta)
+        with self._lock:
+            lista = self._fotos.get(nombre)
+            if not lista:
+                return
+            lista[:] = [(m, r) for m, r in lista if r != ruta]
+            if not lista:
+                del self._fotos[nombre]
+
+    def ultima(self, nombre):
+        """Ruta de la foto más reciente de `nombre` (sin limpiar), o None"""
+        nombre_limpio = limpiar_nombre(nombre)
+        with self._lock:
+            lista = self._fotos.get(nombre_limpio, [])
+            while lista:
+                ruta = lista[-1][1]
+                if os.path.exists(ruta):
+                    return ruta
+                # El archivo se borró por fuera de la app: sacarlo del índice
+                lista.pop()
+            self._fotos.pop(nombre_limpio, None)
+        if self.compartida:
+            return self.buscar_en_disco(nombre)
+        return None
+
+    def buscar_en_disco(self, nombre):
+        """Buscar la foto más reciente de `nombre` en las carpetas de los últimos días y registrarla"""
+        nombre_limpio = limpiar_nombre(nombre)
+        try:
+            dias = sorted((e.name for e in os.scandir(self.carpeta)
+                           if e.is_dir() and e.name not in CARPETAS_IGNORADAS), reverse=True)
+        except FileNotFoundError:
+            return None
+        for dia in dias[:self.dias]:
+            candidatas = []
+            with os.scandir(os.path.join(self.carpeta, dia)) as entradas:
+                for entrada in entradas:
+                    if entrada.is_file() and self._nombre_de(entrada.name) == nombre_limpio:
+                        candidatas.append(entrada.name)
+            if candidatas:
+                # el nombre lleva AAAAMMDD_HHMMSS: el mayor es el más reciente
+                ruta = os.path.join(self.carpeta, dia, max(candidatas))
+                self.registrar(ruta)
+                return ruta
+        return None
+
+    def vigilar(self):
+        """Mantener el índice al día con watchdog si está instalado"""
+        if not WATCHDOG_AVAILABLE or self._observador is not None:
+            return False
+        indice = self
+
+        class _Manejador(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory and "miniaturas" not in event.src_path:
+                    indice.registrar(event.src_path)
+
+            def on_deleted(self, event):
+                if not event.is_directory:
+                    indice.eliminar(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    indice.eliminar(event.src_path)
+                    indice.registrar(event.dest_path)
+
+        os.makedirs(self.carpeta, exist_ok=True)
+        self._observador = Observer()
+        self._observador.daemon = True
+        self._observador.schedule(_Manejador(), self.carpeta, recursive=True)
+        self._observador.start()
+        return True
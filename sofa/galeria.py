@@ -0,0 +1,242 @@
+"""Galería para la pantalla grande del stand: un atlas de miniaturas por día.
+
+Cada día de fotos_stand/ tiene su atlas en fotos_stand/AAAA-MM-DD/galeria/:
+
+    atlas.rgb   celdas de LADO x LADO px en RGB sin comprimir, una tras otra
+    indice.txt  el nombre de la foto de cada celda, en orden; "-nombre" marca
+                que se borró la última celda con ese nombre (queda en blanco).
+                Si la foto se vuelve a tomar con el mismo nombre, entra en una
+                celda nueva.
+
+Las celdas se agregan cuando se guarda la foto (a partir de su miniatura, sin
+abrir la original) y la pantalla arma cada página del mosaico leyendo solo
+esas celdas del atlas con numpy.memmap: nunca decodifica un JPEG por foto.
+Las páginas ya codificadas quedan en una caché LRU hasta que cambie el índice.
+Varios procesos (el pool de trabajadores, otros servidores sobre una carpeta
+compartida) agregan al mismo atlas con un bloqueo de archivo.
+"""
+import os
+import time
+
+from .bloqueo import bloqueo_exclusivo
+from .cache import CacheLRU
+from .fotos import CARPETA_FOTOS, CARPETAS_IGNORADAS, ruta_miniatura
+
+GALERIA_ACTIVA = os.environ.get("SOFA_GALERIA", "1") != "0"
+LADO_CELDA = int(os.environ.get("SOFA_GALERIA_LADO", "192"))
+CALIDAD_PAGINA = int(os.environ.get("SOFA_GALERIA_CALIDAD", "80"))
+# Aunque la carpeta del día no cambie, se vuelve a recorrer cada tanto
+RESINCRONIZAR_SEG = float(os.environ.get("SOFA_GALERIA_RESINCRONIZAR_SEG", "60"))
+COLOR_FONDO = (16, 16, 16)
+EXTENSIONES = (".jpg", ".jpeg", ".webp", ".png")
+
+# Páginas del mosaico ya codificadas en JPEG, compartidas por todas las pantallas
+CACHE_PAGINAS = CacheLRU(int(float(os.environ.get("SOFA_GALERIA_CACHE_MB", "32")) * 1024 * 1024))
+
+
+class Atlas:
+    """Atlas de miniaturas de una carpeta de día"""
+
+    def __init__(self, carpeta_dia, lado=None):
+        self.carpeta_dia = carpeta_dia
+        self.lado = lado or LADO_CELDA
+        self.tam_celda = self.lado * self.lado * 3
+        carpeta = os.path.join(carpeta_dia, "galeria")
+        self.ruta_atlas = os.path.join(carpeta, "atlas.rgb")
+        self.ruta_indice = os.path.join(carpeta, "indice.txt")
+        self.ruta_bloqueo = os.path.join(carpeta, "atlas.lock")
+        self._leido = (None, [], set())  # (versión, nombres, celdas retiradas)
+        self._sincronizado = (None, 0.0)  # (mtime de la carpeta del día, cuándo se recorrió)
+
+    # -----------------------
+    # Índice
+    # -----------------------
+    def version(self):
+        """Cambia cada vez que se agrega o se retira una foto"""
+        try:
+            st = os.stat(self.ruta_indice)
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _leer_indice(self):
+        """(nombres en orden de celda, números de celda retirados); se relee solo si el archivo cambió"""
+        version = self.version()
+        if version is None:
+            return [], set()
+        if self._leido[0] == version:
+            return self._leido[1], self._leido[2]
+        nombres, retiradas, ultima = [], set(), {}
+        with open(self.ruta_indice, encoding="utf-8") as f:
+            for linea in f:
+                linea = linea.rstrip("\n")
+                if linea.startswith("-"):
+                    if linea[1:] in ultima:
+                        retiradas.add(ultima[linea[1:]])
+                elif linea:
+                    ultima[linea] = len(nombres)
+                    nombres.append(linea)
+        self._leido = (version, nombres, retiradas)
+        return nombres, retiradas
+
+    # -----------------------
+    # Escritura
+    # -----------------------
+    def _celda(self, ruta_foto):
+        """Bytes RGB de la celda: la miniatura (o, si no existe, la original) centrada sobre el fondo"""
+        from PIL import Image, ImageOps
+        origen = ruta_miniatura(ruta_foto)
+        if not os.path.exists(origen):
+            origen = ruta_foto
+        with Image.open(origen) as imagen:
+            # JPEG: decodificar directo a la escala más chica que alcance
+            imagen.draft("RGB", (self.lado, self.lado))
+            imagen = ImageOps.exif_transpose(imagen).convert("RGB")
+        imagen.thumbnail((self.lado, self.lado), Image.LANCZOS)
+        celda = Image.new("RGB", (self.lado, self.lado), COLOR_FONDO)
+        celda.paste(imagen, ((self.lado - imagen.width) // 2, (self.lado - imagen.height) // 2))
+        return celda.tobytes()
+
+    def _celda_visible(self, nombre, nombres, retiradas):
+        """Número de la última celda de `nombre` que no se retiró, o None"""
+        for i in range(len(nombres) - 1, -1, -1):
+            if nombres[i] == nombre:
+                return None if i in retiradas else i
+        return None
+
+    def agregar(self, ruta_foto):
+        """Agregar la celda de una foto recién guardada. Devuelve False si ya estaba."""
+        nombre = os.path.basename(ruta_foto)
+        celda = self._celda(ruta_foto)
+        os.makedirs(os.path.dirname(self.ruta_atlas), exist_ok=True)
+        with bloqueo_exclusivo(self.ruta_bloqueo):
+            nombres, retiradas = self._leer_indice()
+            if self._celda_visible(nombre, nombres, retiradas) is not None:
+                return False
+            with open(self.ruta_atlas, "ab") as f:
+                # si un proceso murió entre la celda y el índice, se pisa su celda huérfana
+                f.truncate(len(nombres) * self.tam_celda)
+                f.write(celda)
+            # el índice se escribe después: un lector nunca ve un nombre sin su celda
+            with open(self.ruta_indice, "a", encoding="utf-8") as f:
+                f.write(nombre + "\n")
+        return True
+
+    def quitar(self, ruta_foto):
+        """Sacar una foto borrada: su celda queda en blanco y deja de mostrarse"""
+        nombre = os.path.basename(ruta_foto)
+        if self.version() is None:
+            return False
+        with bloqueo_exclusivo(self.ruta_bloqueo):
+            nombres, retiradas = self._leer_indice()
+            numero = self._celda_visible(nombre, nombres, retiradas)
+            if numero is None:
+                return False
+            with open(self.ruta_atlas, "r+b") as f:
+                f.seek(numero * self.tam_celda)
+                f.write(bytes(COLOR_FONDO) * (self.lado * self.lado))
+            with open(self.ruta_indice, "a", encoding="utf-8") as f:
+                f.write("-" + nombre + "\n")
+        return True
+
+    def sincronizar(self):
+        """
+        Agregar las fotos del día que todavía no están (guardadas antes de la
+        galería o por otra vía). La carpeta se recorre solo si cambió su mtime,
+        si la pasada anterior dejó fotos sin leer o cada RESINCRONIZAR_SEG segundos.
+        """
+        try:
+            mtime = os.stat(self.carpeta_dia).st_mtime_ns
+        except OSError:
+            return 0
+        ahora = time.monotonic()
+        if mtime == self._sincronizado[0] and ahora - self._sincronizado[1] < RESINCRONIZAR_SEG:
+            return 0
+        nombres, retiradas = self._leer_indice()
+        en_atlas = {n for i, n in enumerate(nombres) if i not in retiradas}
+        faltantes = []
+        with os.scandir(self.carpeta_dia) as entradas:
+            for entrada in entradas:
+                if (entrada.is_file() and entrada.name.lower().endswith(EXTENSIONES)
+                        and entrada.name not in en_atlas):
+                    faltantes.append((entrada.stat().st_mtime, entrada.path))
+        agregadas, fallidas = 0, 0
+        for _, ruta in sorted(faltantes):
+            try:
+                agregadas += self.agregar(ruta)
+            except OSError:
+                fallidas += 1  # foto a medio escribir o ilegible: se intenta en la próxima pasada
+        # el mtime se tomó antes de recorrer: una foto que llegó durante la pasada lo cambia
+        self._sincronizado = (None if fallidas else mtime, ahora)
+        return agregadas
+
+    # -----------------------
+    # Lectura
+    # -----------------------
+    def visibles(self):
+        """Celdas que se muestran, de la más nueva a la más vieja: [(número de celda, nombre)]"""
+        nombres, retiradas = self._leer_indice()
+        try:
+            completas = os.path.getsize(self.ruta_atlas) // self.tam_celda
+        except OSError:
+            return []
+        return [(i, n) for i, n in enumerate(nombres[:completas]) if i not in retiradas][::-1]
+
+    def pagina(self, numero, columnas=6, filas=4):
+        """(JPEG del mosaico, páginas, fotos) de la página `numero`; (None, 0, 0) si no hay fotos"""
+        visibles = self.visibles()
+        por_pagina = columnas * filas
+        paginas = -(-len(visibles) // por_pagina)
+        if not paginas:
+            return None, 0, 0
+        numero %= paginas
+        clave = (self.ruta_atlas, self.version(), self.lado, numero, columnas, filas)
+        jpeg = CACHE_PAGINAS.get(clave)
+        if jpeg is None:
+            jpeg = self._componer([i for i, _ in visibles[numero * por_pagina:(numero + 1) * por_pagina]],
+                                  columnas, filas)
+            CACHE_PAGINAS.put(clave, jpeg, len(jpeg))
+        return jpeg, paginas, len(visibles)
+
+    def _componer(self, celdas, columnas, filas):
+        import numpy as np
+        from PIL import Image
+        from .codificacion import codificar
+        n = os.path.getsize(self.ruta_atlas) // self.tam_celda
+        atlas = np.memmap(self.ruta_atlas, dtype=np.uint8, mode="r", shape=(n, self.lado, self.lado, 3))
+        mosaico = np.empty((filas * columnas, self.lado, self.lado, 3), np.uint8)
+        mosaico[:] = COLOR_FONDO
+        mosaico[:len(celdas)] = atlas[celdas]
+        del atlas
+        # (filas*columnas, L, L, 3) -> (filas*L, columnas*L, 3)
+        mosaico = mosaico.reshape(filas, columnas, self.lado, self.lado, 3).swapaxes(1, 2)
+        imagen = Image.fromarray(mosaico.reshape(filas * self.lado, columnas * self.lado, 3))
+        return codificar(imagen, "jpeg", CALIDAD_PAGINA, progresivo=False, optimizar=False)
+
+
+def dias_con_fotos(carpeta=None):
+    """Carpetas de día (AAAA-MM-DD) de la más nueva a la más vieja"""
+    carpeta = carpeta or CARPETA_FOTOS
+    if not os.path.isdir(carpeta):
+        return []
+    with os.scandir(carpeta) as entradas:
+        return sorted((e.name for e in entradas if e.is_dir() and e.name not in CARPETAS_IGNORADAS),
+                      reverse=True)
+
+
+def agregar_a_galeria(ruta_foto):
+    """Sumar una foto recién guardada al atlas de su día; la galería nunca hace fallar el guardado"""
+    if not GALERIA_ACTIVA:
+        return False
+    try:
+        return Atlas(os.path.dirname(ruta_foto)).agregar(ruta_foto)
+    except OSError:
+        return False
+
+
+def quitar_de_galeria(ruta_foto):
+    """Sacar del atlas una foto que se borró (descarga finalizada o retención)"""
+    try:
+        return Atlas(os.path.dirname(ruta_foto)).quitar(ruta_foto)
+    except OSError:
+        return False
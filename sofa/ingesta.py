@@ -0,0 +1,175 @@
+"""Formulario de registro que funciona sin conexión (PWA) y endpoint de ingesta por lotes.
+
+El navegador guarda cada registro en IndexedDB con una clave de idempotencia
+y un service worker lo envía cuando hay red, en lotes, a
+POST /api/registros/lote. Cada registro se valida por separado: la respuesta
+lista las claves confirmadas y las rechazadas (con el motivo), y el navegador
+borra de su cola solo esas. Los válidos del lote se escriben en una sola
+transacción y las claves ya guardadas se ignoran, así un reintento nunca
+duplica registros.
+
+    python -m sofa.ingesta --puerto 8600 --registros registros_sofa.db
+
+El formulario queda en http://servidor:8600/ (stand) y /?origen=dragon (Intento3.py).
+"""
+import argparse
+import http.server
+import json
+import os
+import re
+from datetime import datetime
+
+from .registros import CAMPOS_POR_ORIGEN, abrir_registros
+
+ESTATICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "estatico")
+
+# ruta -> (archivo en estatico/, tipo MIME)
+ARCHIVOS = {
+    "/": ("registro.html", "text/html; charset=utf-8"),
+    "/registro.html": ("registro.html", "text/html; charset=utf-8"),
+    "/cola.js": ("cola.js", "application/javascript; charset=utf-8"),
+    "/sw.js": ("sw.js", "application/javascript; charset=utf-8"),
+    "/manifest.json": ("manifest.json", "application/manifest+json"),
+}
+
+MAX_LOTE = 500
+MAX_CUERPO = 1024 * 1024
+MAX_CAMPO = 200
+_CLAVE_VALIDA = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_FECHA_VALIDA = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+
+def _validar_registro(entrada, campos):
+    """(clave, registro) de una entrada del lote; lanza ValueError con el motivo si no es válida"""
+    clave = entrada.get("clave") if isinstance(entrada, dict) else None
+    if not isinstance(clave, str) or not _CLAVE_VALIDA.match(clave):
+        raise ValueError(f"clave de idempotencia inválida: {clave!r}")
+    crudo = entrada.get("datos") or {}
+    if not isinstance(crudo, dict):
+        raise ValueError("'datos' debe ser un objeto")
+    registro = {}
+    for campo in campos:
+        valor = crudo.get(campo)
+        if valor is not None:
+            registro[campo] = str(valor).strip()[:MAX_CAMPO]
+    if not registro.get("nombre"):
+        raise ValueError("falta el nombre")
+    # la fecha es la del momento en que se llenó el formulario, aunque llegue horas después
+    if not _FECHA_VALIDA.match(registro.get("fecha_registro", "")):
+        registro["fecha_registro"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return clave, registro
+
+
+def validar_lote(datos):
+    """
+    {"origen": "stand", "registros": [{"clave": "...", "datos": {...}}, ...]}
+    -> (origen, [(clave, registro), ...], [{"clave": ..., "motivo": ...}, ...]).
+    Solo se guardan los campos del formulario de ese origen. Un registro
+    inválido va a la lista de rechazados sin afectar al resto; ValueError solo
+    si el lote en sí no es válido (y entonces el navegador conserva su cola).
+    """
+    if not isinstance(datos, dict):
+        raise ValueError("se esperaba un objeto JSON")
+    origen = datos.get("origen", "stand")
+    if origen not in CAMPOS_POR_ORIGEN:
+        raise ValueError(f"origen desconocido: {origen}")
+    entradas = datos.get("registros")
+    if not isinstance(entradas, list) or not entradas:
+        raise ValueError("'registros' debe ser una lista no vacía")
+    if len(entradas) > MAX_LOTE:
+        raise ValueError(f"máximo {MAX_LOTE} registros por lote")
+    campos = [clave for clave, _ in CAMPOS_POR_ORIGEN[origen]]
+    lote, rechazadas = [], []
+    for entrada in entradas:
+        try:
+            lote.append(_validar_registro(entrada, campos))
+        except ValueError as e:
+            clave = entrada.get("clave") if isinstance(entrada, dict) else None
+            rechazadas.append({"clave": clave if isinstance(clave, str) else None, "motivo": str(e)})
+    return origen, lote, rechazadas
+
+
+class _Manejador(http.server.BaseHTTPRequestHandler):
+    def _responder(self, estado, cuerpo, tipo, cache="no-cache"):
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("Cache-Control", cache)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _json(self, estado, datos):
+        self._responder(estado, json.dumps(datos, ensure_ascii=False).encode("utf-8"),
+                        "application/json; charset=utf-8", cache="no-store")
+
+    def do_GET(self):
+        archivo = ARCHIVOS.get(self.path.split("?", 1)[0])
+        if archivo is None:
+            self.send_error(404)
+            return
+        nombre, tipo = archivo
+        with open(os.path.join(ESTATICO, nombre), "rb") as f:
+            # sin caché HTTP: el service worker decide qué se sirve sin conexión
+            self._responder(200, f.read(), tipo)
+
+    def do_POST(self):
+        if self.path != "/api/registros/lote":
+            self.send_error(404)
+            return
+        try:
+            largo = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self._json(400, {"error": "Content-Length inválido"})
+            return
+        if largo <= 0 or largo > MAX_CUERPO:
+            self._json(413 if largo > 0 else 411, {"error": "tamaño de lote inválido"})
+            return
+        try:
+            origen, lote, rechazadas = validar_lote(json.loads(self.rfile.read(largo)))
+        except (ValueError, UnicodeDecodeError) as e:
+            self._json(400, {"error": str(e)})
+            return
+        nuevos, total = 0, None
+        if lote:
+            try:
+                nuevos, total = self.server.registros.agregar_sin_duplicar(lote, origen=origen)
+            except Exception as e:
+                # 503: el cliente conserva el lote en IndexedDB y reintenta más tarde
+                self._json(503, {"error": f"no se pudo guardar: {e}"})
+                return
+        self._json(200, {"confirmadas": [clave for clave, _ in lote], "rechazadas": rechazadas,
+                         "nuevos": nuevos, "total": total})
+
+    def log_message(self, formato, *args):
+        # solo los lotes; los GET de archivos estáticos llenarían la consola
+        if self.command == "POST":
+            super().log_message(formato, *args)
+
+
+def crear_servidor(registros, host="0.0.0.0", puerto=8600):
+    """Servidor HTTP (un hilo por conexión) que escribe en el almacén `registros`"""
+    servidor = http.server.ThreadingHTTPServer((host, puerto), _Manejador)
+    servidor.registros = registros
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Formulario sin conexión e ingesta de registros por lotes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=8600)
+    parser.add_argument("--registros", default=os.environ.get("SOFA_REGISTROS", "registros_sofa.db"),
+                        help="almacén de registros (.db, .jsonl o s3://bucket/prefijo)")
+    args = parser.parse_args()
+
+    servidor = crear_servidor(abrir_registros(args.registros), args.host, args.puerto)
+    print(f"Formulario en http://{args.host}:{args.puerto}/ -> {args.registros}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
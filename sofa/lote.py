@@ -0,0 +1,164 @@
+"""Recomponer en lote las fotos de una carpeta sobre un fondo nuevo.
+
+    python -m sofa.lote fotos_stand --fondo assets/patrocinador.png --salida fotos_patrocinador
+
+Recorre la carpeta como flujo (sin listar todo primero), reparte las fotos en
+un pool de procesos con un número acotado de trabajos en vuelo y anota en un
+manifiesto JSON Lines el hash de cada foto ya procesada, así una ejecución
+interrumpida se puede retomar sin repetir trabajo.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+EXTENSIONES = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def _recorrer(carpeta, excluir):
+    """Rutas de imágenes bajo `carpeta` (recursivo), en el orden en que aparecen"""
+    with os.scandir(carpeta) as entradas:
+        for entrada in entradas:
+            if entrada.is_dir():
+                if os.path.abspath(entrada.path) not in excluir and entrada.name != "miniaturas":
+                    yield from _recorrer(entrada.path, excluir)
+            elif entrada.name.lower().endswith(EXTENSIONES):
+                yield entrada.path
+
+
+def _hash_archivo(ruta):
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _leer_manifiesto(ruta):
+    """(claves ya procesadas, {destino: foto de origen}) de las ejecuciones anteriores"""
+    hechos, destinos = set(), {}
+    if os.path.exists(ruta):
+        with open(ruta, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                    hechos.add(entrada["clave"])
+                except (json.JSONDecodeError, KeyError):
+                    continue  # línea cortada por una interrupción
+                if entrada.get("destino") and entrada.get("origen"):
+                    destinos[os.path.abspath(entrada["destino"])] = os.path.abspath(entrada["origen"])
+    return hechos, destinos
+
+
+def _destino(ruta, origen, salida):
+    """Ruta del JPEG de salida: la misma ruta relativa que en `origen`, con extensión .jpg"""
+    relativa = os.path.relpath(ruta, origen)
+    return os.path.join(salida, os.path.splitext(relativa)[0] + ".jpg")
+
+
+def _procesar(ruta, destino, fondo_path, metodo, calidad):
+    """Trabajo de un proceso: segmentar, componer y guardar como JPEG"""
+    from PIL import Image
+    from .segmentacion import componer_fondo
+    imagen = Image.open(ruta).convert("RGB")
+    final, usado = componer_fondo(imagen, fondo_path=fondo_path, method=metodo)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = destino + ".tmp"
+    final.save(temporal, format="JPEG", quality=calidad, progressive=True, optimize=True)
+    os.replace(temporal, destino)
+    return usado
+
+
+def procesar_carpeta(origen, salida, fondo_path, metodo="auto", trabajadores=None,
+                     calidad=90, manifiesto=None, en_vuelo=None):
+    """Recomponer todas las fotos de `origen` en `salida`. Devuelve (hechas, saltadas, errores, segundos).
+    Saltadas: las que ya estaban en el manifiesto y las que no se pudieron leer al recorrer.
+    Dos fotos con el mismo nombre y distinta extensión (a.jpg y a.png) irían al mismo
+    destino: la segunda no se procesa y cuenta como error."""
+    trabajadores = trabajadores or os.cpu_count() or 1
+    en_vuelo = en_vuelo or trabajadores * 2
+    manifiesto = manifiesto or os.path.join(salida, "manifiesto.jsonl")
+    os.makedirs(salida, exist_ok=True)
+    hechos, destinos = _leer_manifiesto(manifiesto)
+    # el fondo y el método forman parte de la clave: otro fondo = otra pasada
+    sufijo = f"{_hash_archivo(fondo_path)}:{metodo}"
+
+    hechas = saltadas = errores = 0
+    inicio = time.perf_counter()
+    pendientes = {}
+    with open(manifiesto, "a", encoding="utf-8") as registro, \
+            concurrent.futures.ProcessPoolExecutor(
+                max_workers=trabajadores, mp_context=multiprocessing.get_context("spawn")) as pool:
+
+        def recoger():
+            """Esperar a que termine al menos un trabajo y anotar los terminados"""
+            nonlocal hechas, errores
+            listos, _ = concurrent.futures.wait(
+                pendientes, return_when=concurrent.futures.FIRST_COMPLETED)
+            for futuro in listos:
+                ruta, clave, destino = pendientes.pop(futuro)
+                try:
+                    usado = futuro.result()
+                except Exception as e:
+                    errores += 1
+                    print(f"✗ {ruta}: {e}")
+                    continue
+                registro.write(json.dumps({"clave": clave, "origen": ruta, "destino": destino,
+                                           "metodo": usado}, ensure_ascii=False) + "\n")
+                registro.flush()
+                hechas += 1
+                if hechas % 25 == 0:
+                    print(f"{hechas} fotos, {hechas / (time.perf_counter() - inicio):.2f} img/s")
+
+        for ruta in _recorrer(origen, {os.path.abspath(salida)}):
+            try:
+                clave = f"{_hash_archivo(ruta)}:{sufijo}"
+            except OSError as e:
+                # borrada a mitad del recorrido (p. ej. por la retención) o ilegible: no frena el lote
+                saltadas += 1
+                print(f"- {ruta}: {e}")
+                continue
+            if clave in hechos:
+                saltadas += 1
+                continue
+            destino = _destino(ruta, origen, salida)
+            # a.jpg y a.png darían el mismo a.jpg: no pisar la salida de otra foto
+            previa = destinos.setdefault(os.path.abspath(destino), os.path.abspath(ruta))
+            if previa != os.path.abspath(ruta):
+                errores += 1
+                print(f"✗ {ruta}: el destino {destino} ya es de {previa}")
+                continue
+            futuro = pool.submit(_procesar, ruta, destino, fondo_path, metodo, calidad)
+            pendientes[futuro] = (ruta, clave, destino)
+            hechos.add(clave)  # la misma foto copiada dos veces se procesa una vez
+            while len(pendientes) >= en_vuelo:
+                recoger()
+        while pendientes:
+            recoger()
+    return hechas, saltadas, errores, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recomponer en lote las fotos de una carpeta")
+    parser.add_argument("origen", help="carpeta con las fotos originales (p. ej. fotos_stand)")
+    parser.add_argument("--fondo", required=True, help="imagen de fondo nueva")
+    parser.add_argument("--salida", required=True, help="carpeta donde se guardan los resultados")
+    parser.add_argument("--metodo", default="auto", choices=["auto", "mediapipe", "rembg", "grabcut"])
+    parser.add_argument("--trabajadores", type=int, help="procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--calidad", type=int, default=90, help="calidad JPEG de salida")
+    parser.add_argument("--manifiesto", help="por defecto <salida>/manifiesto.jsonl")
+    args = parser.parse_args()
+
+    hechas, saltadas, errores, segundos = procesar_carpeta(
+        args.origen, args.salida, args.fondo, metodo=args.metodo,
+        trabajadores=args.trabajadores, calidad=args.calidad, manifiesto=args.manifiesto)
+    ritmo = hechas / segundos if segundos else 0.0
+    print(f"Listo: {hechas} procesadas, {saltadas} saltadas (ya estaban o ilegibles), {errores} con error "
+          f"en {segundos:.1f} s ({ritmo:.2f} img/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Fotos de las sesiones abiertas con un presupuesto de memoria para todo el proceso.
+
+Las sesiones de Streamlit guardan aquí los bytes de la captura (o de la
+composición) y en session_state solo la clave. Las fotos chicas quedan en
+memoria mientras quepan en el presupuesto; las grandes, y las que desbordan
+el presupuesto (las menos usadas primero), pasan a archivos temporales y no
+ocupan memoria del proceso entre reruns: cada lectura trae los bytes del
+archivo (normalmente desde la caché de páginas del sistema) y quedan libres
+al terminar la corrida del script. Las fotos que nadie pidió en
+SOFA_FOTOS_INACTIVIDAD_SEG segundos (sesiones abandonadas antes de
+"Finalizar") se descartan.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+PRESUPUESTO_MB = float(os.environ.get("SOFA_MEMORIA_FOTOS_MB", "64"))
+MAX_EN_MEMORIA_KB = float(os.environ.get("SOFA_FOTO_EN_MEMORIA_KB", "512"))
+INACTIVIDAD_SEG = float(os.environ.get("SOFA_FOTOS_INACTIVIDAD_SEG", "900"))
+
+
+class _Foto:
+    __slots__ = ("sesion", "tamano", "datos", "ruta", "acceso", "derramando")
+
+    def __init__(self, sesion, tamano):
+        self.sesion = sesion
+        self.tamano = tamano
+        self.datos = None  # bytes si está en memoria
+        self.ruta = None   # archivo temporal si se derramó a disco
+        self.acceso = time.monotonic()
+        self.derramando = False  # elegida para pasar a disco; se sigue leyendo de memoria
+
+
+class MemoriaFotos:
+    """Fotos por clave, en memoria hasta `presupuesto_mb` y en disco el resto.
+
+    Las escrituras a disco se hacen fuera del bloqueo: bajo el bloqueo solo se
+    eligen las fotos a derramar, así una escritura lenta no frena a las demás sesiones.
+    """
+
+    def __init__(self, presupuesto_mb=None, max_en_memoria_kb=None, inactividad_seg=None, carpeta=None):
+        self.presupuesto = int((PRESUPUESTO_MB if presupuesto_mb is None else presupuesto_mb) * 1024 * 1024)
+        self.max_en_memoria = int((MAX_EN_MEMORIA_KB if max_en_memoria_kb is None
+                                   else max_en_memoria_kb) * 1024)
+        self.inactividad = INACTIVIDAD_SEG if inactividad_seg is None else inactividad_seg
+        self._carpeta = carpeta
+        self._fotos = OrderedDict()  # orden de uso: la primera es la menos usada
+        self._en_memoria = 0  # sin contar las que ya se están derramando
+        self._en_disco = 0
+        self._lock = threading.Lock()
+        self._ultima_purga = time.monotonic()
+
+    def _carpeta_temporal(self):
+        with self._lock:
+            if self._carpeta is None:
+                self._carpeta = tempfile.mkdtemp(prefix="sofa_fotos_")
+                atexit.register(shutil.rmtree, self._carpeta, True)
+            return self._carpeta
+
+    def _escribir(self, datos):
+        """Escribir los bytes en un archivo temporal nuevo (sin el bloqueo) y devolver su ruta"""
+        ruta = os.path.join(self._carpeta_temporal(), uuid.uuid4().hex)
+        with open(ruta, "wb") as f:
+            f.write(datos)
+        return ruta
+
+    def _va_a_disco(self, tamano):
+        return tamano > self.max_en_memoria or tamano > self.presupuesto
+
+    def _elegir_para_derramar(self, necesario):
+        """Marcar las fotos en memoria menos usadas hasta que entren `necesario` bytes (con el bloqueo)"""
+        elegidas = []
+        for clave, foto in self._fotos.items():
+            if self._en_memoria + necesario <= self.presupuesto:
+                break
+            if foto.datos is not None and not foto.derramando:
+                foto.derramando = True
+                self._en_memoria -= foto.tamano
+                elegidas.append((clave, foto, foto.datos))
+        return elegidas
+
+    def _derramar(self, elegidas):
+        """Pasar a disco las fotos elegidas (sin el bloqueo)"""
+        for clave, foto, datos in elegidas:
+            try:
+                ruta = self._escribir(datos)
+            except OSError:
+                ruta = None  # disco lleno o sin permisos: la foto sigue en memoria
+            with self._lock:
+                vigente = self._fotos.get(clave) is foto and foto.datos is datos
+                foto.derramando = False
+                if vigente and ruta is not None:
+                    foto.datos = None
+                    foto.ruta = ruta
+                    self._en_disco += foto.tamano
+                    continue
+                if vigente:
+                    self._en_memoria += foto.tamano
+            # la foto se reemplazó o se eliminó mientras se escribía: el archivo sobra
+            if ruta is not None:
+                _borrar(ruta)
+
+    def _quitar(self, clave):
+        foto = self._fotos.pop(clave, None)
+        if foto is None:
+            return
+        if foto.datos is not None and not foto.derramando:
+            self._en_memoria -= foto.tamano
+        foto.datos = None  # si se estaba derramando, _derramar descarta el archivo
+        if foto.ruta is not None:
+            self._en_disco -= foto.tamano
+            _borrar(foto.ruta)
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        # revisar cada tanto, no en cada llamada
+        if ahora - self._ultima_purga < min(60.0, self.inactividad / 4):
+            return
+        self._ultima_purga = ahora
+        limite = ahora - self.inactividad
+        for clave in [c for c, f in self._fotos.items() if f.acceso < limite]:
+            self._quitar(clave)
+
+    def _preparar(self, sesion, datos):
+        """Foto nueva; las grandes se escriben a disco aquí, antes de tomar el bloqueo"""
+        foto = _Foto(sesion, len(datos))
+        if self._va_a_disco(foto.tamano):
+            foto.ruta = self._escribir(datos)
+        return foto
+
+    def _colocar(self, clave, foto, datos):
+        """Registrar la foto (con el bloqueo). Devuelve las fotos que hay que derramar para que entre."""
+        self._fotos[clave] = foto
+        if foto.ruta is not None:
+            self._en_disco += foto.tamano
+            return []
+        elegidas = self._elegir_para_derramar(foto.tamano)
+        foto.datos = datos
+        self._en_memoria += foto.tamano
+        return elegidas
+
+    def guardar(self, sesion, datos):
+        """Guardar los bytes de una foto de `sesion` y devolver su clave"""
+        clave = uuid.uuid4().hex
+        datos = bytes(datos)
+        foto = self._preparar(sesion, datos)
+        with self._lock:
+            self._purgar()
+            elegidas = self._colocar(clave, foto, datos)
+        self._derramar(elegidas)
+        return clave
+
+    def leer(self, clave):
+        """Bytes de la foto, o None si la clave no existe o se descartó por inactividad"""
+        with self._lock:
+            self._purgar()
+            foto = self._fotos.get(clave)
+            if foto is None:
+                return None
+            foto.acceso = time.monotonic()
+            self._fotos.move_to_end(clave)
+            if foto.datos is not None:
+                return foto.datos
+            ruta = foto.ruta
+        # una sola lectura al tamaño justo: Streamlit (st.image, download_button) necesita bytes
+        try:
+            with open(ruta, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def reemplazar(self, clave, datos):
+        """Cambiar los bytes de una foto conservando su clave y su sesión"""
+        datos = bytes(datos)
+        with self._lock:
+            anterior = self._fotos.get(clave)
+            if anterior is None:
+                raise KeyError(clave)
+        foto = self._preparar(anterior.sesion, datos)
+        with self._lock:
+            if clave not in self._fotos:
+                # se eliminó mientras se escribía
+                if foto.ruta is not None:
+                    _borrar(foto.ruta)
+                raise KeyError(clave)
+            self._quitar(clave)
+            elegidas = self._colocar(clave, foto, datos)
+        self._derramar(elegidas)
+        return clave
+
+    def eliminar(self, clave):
+        with self._lock:
+            self._quitar(clave)
+
+    def eliminar_sesion(self, sesion):
+        """Descartar todas las fotos de una sesión (p. ej. al finalizar el registro)"""
+        with self._lock:
+            for clave in [c for c, f in self._fotos.items() if f.sesion == sesion]:
+                self._quitar(clave)
+
+    def estado(self):
+        """Resumen para el panel o las métricas"""
+        with self._lock:
+            return {
+                "fotos": len(self._fotos),
+                "sesiones": len({f.sesion for f in self._fotos.values()}),
+                "en_memoria_mb": round(self._en_memoria / 1024 / 1024, 2),
+                "en_disco_mb": round(self._en_disco / 1024 / 1024, 2),
+                "presupuesto_mb": round(self.presupuesto / 1024 / 1024, 2),
+            }
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+# Una sola instancia por proceso, compartida por todas las sesiones
+MEMORIA_FOTOS = MemoriaFotos()
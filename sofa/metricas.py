@@ -0,0 +1,229 @@
+"""Métricas ligeras de las apps del stand: tiempos por etapa y contadores.
+
+Se activan con SOFA_METRICAS=1. Apagadas, `medir` devuelve la función tal
+cual (sin envoltura) y `contar` / `cronometro` no hacen nada, así el costo es
+despreciable. Encendidas, se exponen en formato Prometheus en
+http://0.0.0.0:SOFA_METRICAS_PUERTO/metrics (si el puerto es distinto de 0) y/o
+se vuelcan periódicamente a un JSON en SOFA_METRICAS_ARCHIVO.
+
+Lo que se mide dentro de un trabajador del pool de procesos no llega solo al
+registro de la app: el trabajo corre dentro de `capturar()`, devuelve sus
+mediciones junto con el resultado y la app las suma con `registrar_capturadas`.
+"""
+import bisect
+import contextlib
+import functools
+import http.server
+import json
+import os
+import threading
+import time
+
+ACTIVAS = os.environ.get("SOFA_METRICAS", "0") == "1"
+PUERTO = int(os.environ.get("SOFA_METRICAS_PUERTO", "0"))
+ARCHIVO = os.environ.get("SOFA_METRICAS_ARCHIVO", "")
+
+# Límites de los cubos del histograma, en segundos
+CUBOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histograma:
+    """Histograma de latencias con cubos fijos (memoria constante)"""
+
+    def __init__(self):
+        self.cubos = [0] * (len(CUBOS) + 1)
+        self.cuenta = 0
+        self.suma = 0.0
+
+    def observar(self, segundos):
+        self.cubos[bisect.bisect_left(CUBOS, segundos)] += 1
+        self.cuenta += 1
+        self.suma += segundos
+
+    def percentil(self, p):
+        """Estimación del percentil `p` (0..1) por interpolación dentro del cubo"""
+        if not self.cuenta:
+            return None
+        objetivo = p * self.cuenta
+        acumulado = 0
+        for i, n in enumerate(self.cubos):
+            if n and acumulado + n >= objetivo:
+                inferior = CUBOS[i - 1] if i > 0 else 0.0
+                superior = CUBOS[i] if i < len(CUBOS) else CUBOS[-1] * 2
+                return inferior + (superior - inferior) * (objetivo - acumulado) / n
+            acumulado += n
+        return CUBOS[-1]
+
+
+class Registro:
+    """Contadores e histogramas del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+
+    def contar(self, nombre, n=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def observar(self, etapa, segundos):
+        with self._lock:
+            hist = self.histogramas.get(etapa)
+            if hist is None:
+                hist = self.histogramas[etapa] = Histograma()
+            hist.observar(segundos)
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "contadores": dict(self.contadores),
+                "etapas": {
+                    etapa: {
+                        "cuenta": h.cuenta,
+                        "promedio_ms": round(h.suma / h.cuenta * 1000, 2) if h.cuenta else None,
+                        "p50_ms": round(h.percentil(0.5) * 1000, 2) if h.cuenta else None,
+                        "p95_ms": round(h.percentil(0.95) * 1000, 2) if h.cuenta else None,
+                    }
+                    for etapa, h in self.histogramas.items()
+                },
+            }
+
+    def prometheus(self):
+        """Texto en el formato de exposición de Prometheus"""
+        lineas = []
+        with self._lock:
+            for nombre, valor in sorted(self.contadores.items()):
+                lineas.append(f"# TYPE sofa_{nombre}_total counter")
+                lineas.append(f"sofa_{nombre}_total {valor}")
+            if self.histogramas:
+                lineas.append("# TYPE sofa_etapa_segundos histogram")
+            for etapa, h in sorted(self.histogramas.items()):
+                acumulado = 0
+                for limite, n in zip(CUBOS, h.cubos):
+                    acumulado += n
+                    lineas.append(f'sofa_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+                lineas.append(f'sofa_etapa_segundos_bucket{{etapa="{etapa}",le="+Inf"}} {h.cuenta}')
+                lineas.append(f'sofa_etapa_segundos_sum{{etapa="{etapa}"}} {h.suma}')
+                lineas.append(f'sofa_etapa_segundos_count{{etapa="{etapa}"}} {h.cuenta}')
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = Registro()
+
+# Mediciones capturadas por el hilo actual (None: van directo a REGISTRO)
+_captura = threading.local()
+
+
+@contextlib.contextmanager
+def capturar():
+    """Juntar en una lista [(etapa, segundos, fallo)] lo que se mida dentro del bloque, sin tocar REGISTRO"""
+    anterior = getattr(_captura, "mediciones", None)
+    mediciones = _captura.mediciones = []
+    try:
+        yield mediciones
+    finally:
+        _captura.mediciones = anterior
+
+
+def registrar_capturadas(mediciones):
+    """Sumar al registro del proceso las mediciones que trajo un trabajo"""
+    if not ACTIVAS:
+        return
+    for etapa, segundos, fallo in mediciones:
+        if fallo:
+            REGISTRO.contar(f"errores_{etapa}")
+        REGISTRO.observar(etapa, segundos)
+
+
+def contar(nombre, n=1):
+    """Sumar `n` al contador `nombre` (registros, fotos, errores, ...)"""
+    if ACTIVAS:
+        REGISTRO.contar(nombre, n)
+
+
+@contextlib.contextmanager
+def cronometro(etapa):
+    """Medir la duración de un bloque with; los errores se cuentan como `errores_<etapa>`"""
+    if not ACTIVAS:
+        yield
+        return
+    inicio = time.perf_counter()
+    fallo = False
+    try:
+        yield
+    except Exception:
+        fallo = True
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        mediciones = getattr(_captura, "mediciones", None)
+        if mediciones is not None:
+            mediciones.append((etapa, segundos, fallo))
+        else:
+            if fallo:
+                REGISTRO.contar(f"errores_{etapa}")
+            REGISTRO.observar(etapa, segundos)
+
+
+def medir(etapa):
+    """Decorador: mide cada llamada de la función como la etapa `etapa`"""
+    def decorador(funcion):
+        if not ACTIVAS:
+            return funcion
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with cronometro(etapa):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+class _Manejador(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/metrics", ""):
+            cuerpo = REGISTRO.prometheus().encode("utf-8")
+            tipo = "text/plain; version=0.0.4"
+        elif self.path.rstrip("/") == "/metrics.json":
+            cuerpo = json.dumps(REGISTRO.resumen(), ensure_ascii=False).encode("utf-8")
+            tipo = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass  # no llenar la consola de Streamlit con cada consulta
+
+
+def _volcar_periodicamente(ruta, intervalo):
+    while True:
+        time.sleep(intervalo)
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(REGISTRO.resumen(), f, ensure_ascii=False, indent=2)
+        os.replace(temporal, ruta)
+
+
+def iniciar_exportacion(puerto=None, archivo=None, intervalo=10):
+    """Arrancar el endpoint HTTP y/o el volcado a JSON (solo si las métricas están activas)"""
+    if not ACTIVAS:
+        return False
+    puerto = PUERTO if puerto is None else puerto
+    archivo = archivo or ARCHIVO
+    if puerto:
+        try:
+            servidor = http.server.ThreadingHTTPServer(("0.0.0.0", puerto), _Manejador)
+        except OSError:
+            servidor = None  # otro proceso de la app ya expone el puerto
+        if servidor is not None:
+            threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    if archivo:
+        threading.Thread(target=_volcar_periodicamente, args=(archivo, intervalo),
+                         name="metricas-archivo", daemon=True).start()
+    return True
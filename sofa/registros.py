@@ -0,0 +1,774 @@
+"""Almacenamiento de los registros de visitantes del stand."""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from .bloqueo import bloqueo_exclusivo
+
+
+class RegistroJSONL:
+    """Registros en formato JSON Lines: una línea por visitante, solo se agrega al final.
+
+    Cada escritura toma un bloqueo entre procesos, de modo que varios kioscos
+    en el mismo servidor no se pisan, y el total se mantiene contando solo las
+    líneas nuevas desde la última lectura en vez de releer todo el archivo.
+    """
+
+    def __init__(self, ruta, legado=None):
+        self.ruta = ruta
+        self._ruta_bloqueo = ruta + ".lock"
+        # claves de idempotencia ya guardadas, una por línea (ver agregar_sin_duplicar)
+        self._ruta_claves = ruta + ".claves"
+        self._lock = threading.Lock()
+        self._offset = 0
+        self._total = 0
+        self._claves = set()
+        self._offset_claves = 0
+        # Migrar una sola vez el archivo JSON antiguo (lista de registros)
+        if legado and os.path.exists(legado) and not os.path.exists(ruta):
+            with bloqueo_exclusivo(self._ruta_bloqueo):
+                if not os.path.exists(ruta):
+                    self._escribir(_leer_json_legado(legado))
+
+    def _sincronizar(self, f):
+        """
+        Contar los registros agregados (por este u otros procesos) desde la última
+        lectura. Solo cuentan las líneas completas que son JSON válido: la línea
+        cortada por un corte de energía no es un registro.
+        """
+        f.seek(0, os.SEEK_END)
+        if f.tell() < self._offset:
+            # El archivo fue reemplazado por uno más corto: contar de nuevo
+            self._offset = 0
+            self._total = 0
+        f.seek(self._offset)
+        for linea in f:
+            if not linea.endswith(b"\n"):
+                break  # línea a medio escribir: se revisa cuando esté completa
+            self._offset += len(linea)
+            if _es_registro(linea):
+                self._total += 1
+
+    def _escribir(self, registros):
+        datos = b"".join(
+            json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in registros
+        )
+        with open(self.ruta, "a+b") as f:
+            self._sincronizar(f)
+            f.seek(0, os.SEEK_END)
+            if f.tell() > self._offset:
+                # Si un corte dejó una línea a medias, no pegarle el registro nuevo
+                datos = b"\n" + datos
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+            self._sincronizar(f)
+        return self._total
+
+    def agregar(self, registro):
+        """Agregar un registro y devolver el total de registros guardados"""
+        return self.agregar_lote([registro])
+
+    def agregar_lote(self, registros):
+        """Agregar varios registros con una sola escritura y devolver el total"""
+        with self._lock, bloqueo_exclusivo(self._ruta_bloqueo):
+            return self._escribir(registros)
+
+    def agregar_sin_duplicar(self, lote, origen=None):
+        """
+        Agregar pares (clave_idempotencia, registro) con una sola escritura; las
+        claves ya guardadas (por cualquier proceso) se ignoran. Con `origen`, cada
+        registro lo lleva en su campo "origen". Devuelve (nuevos, total).
+        """
+        lote = [(clave, _con_origen(registro, origen)) for clave, registro in lote]
+        with self._lock, bloqueo_exclusivo(self._ruta_bloqueo):
+            with open(self._ruta_claves, "a+", encoding="utf-8") as f:
+                f.seek(self._offset_claves)
+                self._claves.update(linea.strip() for linea in f if linea.strip())
+                nuevos, vistas = [], set()
+                for clave, registro in lote:
+                    if clave not in self._claves and clave not in vistas:
+                        vistas.add(clave)
+                        nuevos.append((clave, registro))
+                if not nuevos:
+                    self._offset_claves = f.tell()
+                    with open(self.ruta, "a+b") as g:
+                        self._sincronizar(g)
+                    return 0, self._total
+                # primero los registros: si hay un corte entre las dos escrituras,
+                # un reintento duplica en vez de perder el registro
+                total = self._escribir([r for _, r in nuevos])
+                f.write("".join(clave + "\n" for clave, _ in nuevos))
+                f.flush()
+                os.fsync(f.fileno())
+                self._offset_claves = f.tell()
+                self._claves.update(vistas)
+            return len(nuevos), total
+
+    def total(self):
+        """Total de registros guardados (solo lee lo agregado desde la última consulta)"""
+        if not os.path.exists(self.ruta):
+            return 0
+        with self._lock, open(self.ruta, "rb") as f:
+            self._sincronizar(f)
+            return self._total
+
+    def iterar(self):
+        """Recorrer los registros guardados sin cargarlos todos en memoria"""
+        if not os.path.exists(self.ruta):
+            return
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            for linea in f:
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    yield json.loads(linea)
+                except json.JSONDecodeError:
+                    # Línea incompleta por un corte de energía: se ignora
+                    continue
+
+    def leer_desde(self, cursor=0):
+        """
+        Registros agregados después de `cursor` (posición en bytes) y el cursor nuevo.
+        Solo se leen líneas completas, así una escritura en curso se toma en la próxima llamada.
+        """
+        if not os.path.exists(self.ruta):
+            return [], cursor
+        with open(self.ruta, "rb") as f:
+            f.seek(cursor)
+            datos = f.read()
+        fin = datos.rfind(b"\n") + 1
+        registros = []
+        for linea in datos[:fin].splitlines():
+            try:
+                if linea.strip():
+                    registros.append(json.loads(linea))
+            except json.JSONDecodeError:
+                continue
+        return registros, cursor + fin
+
+    def consultar(self, desde=None, hasta=None, interes=None, carrera=None, deduplicar=False):
+        """
+        Registros normalizados (COLUMNAS_EXPORTACION) que cumplen los filtros, en
+        orden de llegada. Con `deduplicar` queda solo el último por contacto; para
+        eso se hace una primera pasada que guarda un resumen de 8 bytes por contacto.
+        """
+        return _consultar_iterando(self.iterar, desde, hasta, interes, carrera, deduplicar)
+
+    def importar_json(self, origen):
+        """Agregar los registros de un archivo JSON antiguo (lista de objetos)"""
+        registros = _leer_json_legado(origen)
+        if registros:
+            self.agregar_lote(registros)
+        return len(registros)
+
+    def exportar_json(self, destino):
+        """Escribir todos los registros en el formato JSON antiguo (lista con indent=2)"""
+        _exportar_lista_json(self.iterar(), destino)
+
+
+# Campos de cada formulario y la columna de la tabla donde se guardan.
+# "stand" es pagina_basica/app.py y "dragon" es Intento3.py.
+CAMPOS_POR_ORIGEN = {
+    "stand": [
+        ("nombre", "nombre"),
+        ("interes_universidad", "interes"),
+        ("carrera_interes", "carrera"),
+        ("semestre_ingreso", "periodo"),
+        ("contacto", "contacto"),
+        ("tiene_foto", "tiene_foto"),
+        ("fecha_registro", "fecha_registro"),
+    ],
+    "dragon": [
+        ("nombre", "nombre"),
+        ("celular", "celular"),
+        ("correo", "correo"),
+        ("interes_uni", "interes"),
+        ("carrera", "carrera"),
+        ("periodo", "periodo"),
+        ("fecha_registro", "fecha_registro"),
+    ],
+}
+
+COLUMNAS = ["origen", "nombre", "interes", "carrera", "periodo", "contacto",
+            "celular", "correo", "tiene_foto", "fecha_registro", "extra"]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    origen TEXT NOT NULL,
+    nombre TEXT,
+    interes TEXT,
+    carrera TEXT,
+    periodo TEXT,
+    contacto TEXT,
+    celular TEXT,
+    correo TEXT,
+    tiene_foto TEXT,
+    fecha_registro TEXT,
+    extra TEXT,
+    clave_idempotencia TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_registros_fecha ON registros(fecha_registro);
+CREATE INDEX IF NOT EXISTS idx_registros_carrera ON registros(carrera);
+CREATE INDEX IF NOT EXISTS idx_registros_interes ON registros(interes);
+CREATE TABLE IF NOT EXISTS importaciones (
+    archivo TEXT PRIMARY KEY,
+    cantidad INTEGER,
+    fecha TEXT
+);
+"""
+
+
+# Columnas comunes a los dos formularios, en el orden en que se exportan
+COLUMNAS_EXPORTACION = ["fecha_registro", "origen", "nombre", "interes", "carrera",
+                        "periodo", "contacto", "celular", "correo", "tiene_foto"]
+
+# Contacto para deduplicar: correo, si no celular, si no el contacto libre de app.py
+_SQL_CLAVE_CONTACTO = (
+    "lower(trim(COALESCE(NULLIF(trim(correo), ''), NULLIF(trim(celular), ''), "
+    "NULLIF(NULLIF(trim(contacto), ''), 'No proporcionado'))))"
+)
+
+
+def origen_de(registro):
+    """Adivinar qué formulario generó un registro por sus claves"""
+    if "origen" in registro:
+        return registro["origen"]
+    return "dragon" if "interes_uni" in registro or "correo" in registro else "stand"
+
+
+def _con_origen(registro, origen):
+    """El registro con su formulario anotado, para los almacenes que no tienen columna `origen`"""
+    if not origen or registro.get("origen") == origen:
+        return registro
+    return {**registro, "origen": origen}
+
+
+def normalizar(registro, origen=None):
+    """Llevar un registro de cualquiera de los formularios a COLUMNAS_EXPORTACION"""
+    origen = origen or origen_de(registro)
+    fila = dict.fromkeys(COLUMNAS_EXPORTACION)
+    fila["origen"] = origen
+    for clave, columna in CAMPOS_POR_ORIGEN.get(origen, []):
+        if clave in registro:
+            fila[columna] = registro[clave]
+    return fila
+
+
+def clave_contacto(fila):
+    """Misma regla que _SQL_CLAVE_CONTACTO sobre una fila normalizada (None si no hay contacto)"""
+    for columna in ("correo", "celular", "contacto"):
+        valor = (fila.get(columna) or "").strip()
+        if valor and valor != "No proporcionado":
+            return valor.lower()
+    return None
+
+
+def clave_idempotencia(*partes):
+    """Clave estable para un envío: los mismos datos en la misma sesión dan la misma clave"""
+    texto = "\x1f".join("" if p is None else str(p) for p in partes)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _resumen_clave(clave):
+    return hashlib.blake2b(clave.encode("utf-8"), digest_size=8).digest()
+
+
+def _cumple(fila, desde, hasta, interes, carrera):
+    fecha = fila.get("fecha_registro") or ""
+    if desde and fecha < str(desde):
+        return False
+    if hasta and fecha[:10] > str(hasta):
+        return False
+    if interes and fila.get("interes") not in interes:
+        return False
+    if carrera and fila.get("carrera") not in carrera:
+        return False
+    return True
+
+
+def _consultar_iterando(iterar, desde, hasta, interes, carrera, deduplicar):
+    """`consultar` para almacenes sin SQL: filtra en Python recorriendo `iterar()` una o dos veces"""
+    ultimo = {}
+    if deduplicar:
+        for i, registro in enumerate(iterar()):
+            fila = normalizar(registro)
+            if _cumple(fila, desde, hasta, interes, carrera):
+                clave = clave_contacto(fila)
+                if clave is not None:
+                    ultimo[_resumen_clave(clave)] = i
+    for i, registro in enumerate(iterar()):
+        fila = normalizar(registro)
+        if not _cumple(fila, desde, hasta, interes, carrera):
+            continue
+        if deduplicar:
+            clave = clave_contacto(fila)
+            if clave is not None and ultimo.get(_resumen_clave(clave)) != i:
+                continue
+        yield fila
+
+
+class RegistroSQLite:
+    """Registros en una base SQLite en modo WAL, compartida por app.py e Intento3.py.
+
+    Cada hilo usa su propia conexión; WAL permite que un proceso escriba
+    mientras otros leen, y el `timeout` de la conexión hace esperar a los
+    escritores concurrentes en vez de fallar.
+    """
+
+    def __init__(self, ruta, origen="stand", legado=None):
+        self.ruta = ruta
+        self.origen = origen
+        self._local = threading.local()
+        with self._conexion() as con:
+            con.executescript(ESQUEMA)
+            # Bases creadas antes de las claves de idempotencia
+            columnas = {fila[1] for fila in con.execute("PRAGMA table_info(registros)")}
+            if "clave_idempotencia" not in columnas:
+                con.execute("ALTER TABLE registros ADD COLUMN clave_idempotencia TEXT")
+            con.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_registros_clave "
+                        "ON registros(clave_idempotencia)")
+        if legado and os.path.exists(legado):
+            self.importar_json(legado, origen=origen)
+
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def _a_fila(self, registro, origen):
+        campos = dict(CAMPOS_POR_ORIGEN.get(origen, []))
+        fila = dict.fromkeys(COLUMNAS)
+        fila["origen"] = origen
+        extra = {}
+        for clave, valor in registro.items():
+            if clave in campos:
+                fila[campos[clave]] = valor
+            else:
+                extra[clave] = valor
+        if extra:
+            fila["extra"] = json.dumps(extra, ensure_ascii=False)
+        return [fila[c] for c in COLUMNAS]
+
+    def _a_registro(self, fila):
+        fila = dict(zip(COLUMNAS, fila))
+        registro = {clave: fila[columna]
+                    for clave, columna in CAMPOS_POR_ORIGEN.get(fila["origen"], [])}
+        if fila["extra"]:
+            registro.update(json.loads(fila["extra"]))
+        return registro
+
+    def agregar(self, registro):
+        """Agregar un registro y devolver el total de registros guardados"""
+        return self.agregar_lote([registro])
+
+    def agregar_lote(self, registros, origen=None):
+        """Agregar varios registros en una sola transacción y devolver el total"""
+        origen = origen or self.origen
+        filas = [self._a_fila(r, origen) for r in registros]
+        con = self._conexion()
+        with con:
+            con.executemany(
+                f"INSERT INTO registros ({', '.join(COLUMNAS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNAS))})",
+                filas,
+            )
+        return self.total()
+
+    def agregar_sin_duplicar(self, lote, origen=None):
+        """
+        Agregar pares (clave_idempotencia, registro) en una sola transacción; las
+        claves ya guardadas se ignoran (INSERT OR IGNORE sobre un índice UNIQUE),
+        así reenviar un lote no duplica nada. Devuelve (nuevos, total).
+        """
+        origen = origen or self.origen
+        filas = [self._a_fila(r, origen) + [clave] for clave, r in lote]
+        con = self._conexion()
+        with con:
+            cursor = con.executemany(
+                f"INSERT OR IGNORE INTO registros ({', '.join(COLUMNAS)}, clave_idempotencia) "
+                f"VALUES ({', '.join('?' * (len(COLUMNAS) + 1))})",
+                filas,
+            )
+        return max(cursor.rowcount, 0), self.total()
+
+    def total(self):
+        """Total de registros guardados"""
+        return self._conexion().execute("SELECT COUNT(*) FROM registros").fetchone()[0]
+
+    def iterar(self, origen=None, lote=500):
+        """Recorrer los registros en el orden en que se guardaron, por lotes"""
+        sql = f"SELECT {', '.join(COLUMNAS)} FROM registros"
+        parametros = ()
+        if origen:
+            sql += " WHERE origen = ?"
+            parametros = (origen,)
+        cursor = self._conexion().execute(sql + " ORDER BY id", parametros)
+        while True:
+            filas = cursor.fetchmany(lote)
+            if not filas:
+                return
+            for fila in filas:
+                yield self._a_registro(fila)
+
+    def leer_desde(self, cursor=0):
+        """Registros con id mayor que `cursor` y el cursor nuevo (último id leído)"""
+        filas = self._conexion().execute(
+            f"SELECT id, {', '.join(COLUMNAS)} FROM registros WHERE id > ? ORDER BY id",
+            (cursor,),
+        ).fetchall()
+        if not filas:
+            return [], cursor
+        return [self._a_registro(f[1:]) for f in filas], filas[-1][0]
+
+    def consultar(self, desde=None, hasta=None, interes=None, carrera=None,
+                  deduplicar=False, lote=500):
+        """
+        Registros normalizados (COLUMNAS_EXPORTACION) que cumplen los filtros, en
+        orden de llegada y leídos por lotes. Con `deduplicar` queda solo el último
+        por contacto; el agrupamiento lo hace SQLite, no la memoria de Python.
+        """
+        condiciones, parametros = [], []
+        if desde:
+            condiciones.append("fecha_registro >= ?")
+            parametros.append(str(desde))
+        if hasta:
+            condiciones.append("fecha_registro < date(?, '+1 day')")
+            parametros.append(str(hasta))
+        for columna, valores in (("interes", interes), ("carrera", carrera)):
+            if valores:
+                condiciones.append(f"{columna} IN ({', '.join('?' * len(valores))})")
+                parametros.extend(valores)
+        donde = " AND ".join(condiciones) or "1"
+        columnas = ", ".join(COLUMNAS_EXPORTACION)
+        if deduplicar:
+            sql = f"""
+                WITH r AS (
+                    SELECT id, {columnas}, {_SQL_CLAVE_CONTACTO} AS clave
+                    FROM registros WHERE {donde}
+                )
+                SELECT {columnas} FROM r
+                WHERE clave IS NULL
+                   OR id IN (SELECT MAX(id) FROM r WHERE clave IS NOT NULL GROUP BY clave)
+                ORDER BY id"""
+        else:
+            sql = f"SELECT {columnas} FROM registros WHERE {donde} ORDER BY id"
+        cursor = self._conexion().execute(sql, parametros)
+        while True:
+            filas = cursor.fetchmany(lote)
+            if not filas:
+                return
+            for fila in filas:
+                yield dict(zip(COLUMNAS_EXPORTACION, fila))
+
+    def importar_json(self, origen_archivo, origen=None):
+        """Importar una sola vez un archivo JSON o JSON Lines de registros antiguos"""
+        archivo = os.path.abspath(origen_archivo)
+        con = self._conexion()
+        # consulta rápida para no leer el archivo en cada arranque; la que decide es la de abajo
+        if con.execute("SELECT 1 FROM importaciones WHERE archivo = ?", (archivo,)).fetchone():
+            return 0
+        registros = _leer_json_legado(archivo)
+        filas = [self._a_fila(r, origen or self.origen) for r in registros]
+        with con:
+            # Registrar la importación en la misma transacción que las filas. Si otro
+            # proceso (app.py e Intento3.py arrancando a la vez) ya la registró, el
+            # INSERT OR IGNORE no inserta nada y este proceso no importa las filas
+            cursor = con.execute(
+                "INSERT OR IGNORE INTO importaciones (archivo, cantidad, fecha) VALUES (?, ?, ?)",
+                (archivo, len(filas), datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            if cursor.rowcount == 0:
+                return 0
+            con.executemany(
+                f"INSERT INTO registros ({', '.join(COLUMNAS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNAS))})",
+                filas,
+            )
+        return len(filas)
+
+    def exportar_json(self, destino, origen=None):
+        """Escribir los registros en el formato JSON antiguo (lista con indent=2)"""
+        _exportar_lista_json(self.iterar(origen=origen), destino)
+
+
+class RegistroS3:
+    """Registros en un bucket S3 compatible (MinIO, moto), para varios servidores sin disco común.
+
+    Cada `agregar_lote` sube un objeto JSON Lines nuevo y nadie reescribe lo
+    que subió otro servidor. La clave `{tiempo_ns}-{aleatorio}-{cantidad}.jsonl`
+    deja los objetos en orden de llegada y permite contar sin bajarlos. Un
+    objeto de hace menos de MARGEN_SEG segundos todavía puede tener vecinos
+    más viejos en camino (subidas lentas, relojes algo desfasados), así que
+    `leer_desde` solo avanza el cursor hasta los objetos más viejos que eso.
+    """
+
+    MARGEN_SEG = 30
+
+    def __init__(self, url, legado=None, endpoint=None):
+        from .almacen import cliente_s3, separar_url_s3
+        self.bucket, prefijo = separar_url_s3(url)
+        self.prefijo = prefijo + "registros/"
+        self._prefijo_claves = prefijo + "claves/"
+        self._s3 = cliente_s3(endpoint)
+        self._lock = threading.Lock()
+        self._cursor = ""  # última clave estable ya contada
+        self._total = 0
+        if legado and os.path.exists(legado):
+            self._importar_legado(legado)
+
+    def _existe(self, clave):
+        try:
+            self._s3.head_object(Bucket=self.bucket, Key=clave)
+            return True
+        except Exception:
+            return False
+
+    def _subir(self, clave, registros, **condiciones):
+        datos = b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in registros)
+        self._s3.put_object(Bucket=self.bucket, Key=clave, Body=datos,
+                            ContentType="application/x-ndjson", **condiciones)
+
+    def _importar_legado(self, legado):
+        """
+        Subir una sola vez el archivo JSON antiguo. La clave sale del contenido:
+        los servidores con la misma copia escriben el mismo objeto (con escritura
+        condicional, el segundo no lo pisa) y se importa una sola vez.
+        """
+        from botocore.exceptions import ClientError
+        h = hashlib.sha256()
+        with open(legado, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+        resumen = h.hexdigest()[:16]
+        registros = _leer_json_legado(legado)
+        clave = f"{self.prefijo}{0:020d}-legado{resumen}-{len(registros)}.jsonl"
+        if not registros or self._existe(clave):
+            return
+        try:
+            self._subir(clave, registros, IfNoneMatch="*")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("PreconditionFailed",
+                                                                "ConditionalRequestConflict"):
+                raise
+
+    def _claves(self, despues=""):
+        """Claves de los objetos de registros posteriores a `despues`, en orden"""
+        parametros = {"Bucket": self.bucket, "Prefix": self.prefijo}
+        if despues:
+            parametros["StartAfter"] = despues
+        for pagina in self._s3.get_paginator("list_objects_v2").paginate(**parametros):
+            for objeto in pagina.get("Contents", []):
+                if objeto["Key"].endswith(".jsonl"):
+                    yield objeto["Key"]
+
+    def _cantidad(self, clave):
+        return int(clave.rsplit("-", 1)[1][:-len(".jsonl")])
+
+    def _estable(self, clave):
+        tiempo_ns = int(clave[len(self.prefijo):].split("-", 1)[0])
+        return tiempo_ns < (time.time() - self.MARGEN_SEG) * 1e9
+
+    def _leer(self, clave):
+        cuerpo = self._s3.get_object(Bucket=self.bucket, Key=clave)["Body"].read()
+        return [json.loads(linea) for linea in cuerpo.splitlines() if linea.strip()]
+
+    def agregar(self, registro):
+        """Agregar un registro y devolver el total de registros guardados"""
+        return self.agregar_lote([registro])
+
+    def agregar_lote(self, registros):
+        """Subir varios registros como un solo objeto y devolver el total"""
+        registros = list(registros)
+        if registros:
+            clave = f"{self.prefijo}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}-{len(registros)}.jsonl"
+            self._subir(clave, registros)
+        return self.total()
+
+    def _reclamar(self, clave):
+        """Crear el marcador de `clave` solo si no existe (If-None-Match). False si otro ya la tenía."""
+        from botocore.exceptions import ClientError
+        try:
+            self._s3.put_object(Bucket=self.bucket, Key=self._prefijo_claves + clave,
+                                Body=b"", IfNoneMatch="*")
+            return True
+        except ClientError as e:
+            # 412: ya existía; 409: otro servidor la está creando en este mismo momento
+            if e.response.get("Error", {}).get("Code") in ("PreconditionFailed",
+                                                            "ConditionalRequestConflict"):
+                return False
+            raise
+
+    def _claves_guardadas(self, claves):
+        """Cuáles de `claves` ya tienen marcador, con un solo listado de claves/"""
+        guardadas = set()
+        paginador = self._s3.get_paginator("list_objects_v2")
+        for pagina in paginador.paginate(Bucket=self.bucket, Prefix=self._prefijo_claves):
+            for objeto in pagina.get("Contents", []):
+                clave = objeto["Key"][len(self._prefijo_claves):]
+                if clave in claves:
+                    guardadas.add(clave)
+        return guardadas
+
+    def agregar_sin_duplicar(self, lote, origen=None):
+        """
+        Agregar pares (clave_idempotencia, registro) como un solo objeto. Cada clave
+        se reclama antes con un marcador vacío en claves/ creado con escritura
+        condicional, así dos servidores que reciben el mismo reintento no guardan
+        el registro dos veces. Con `origen`, cada registro lo lleva en su campo
+        "origen". Devuelve (nuevos, total).
+        """
+        lote = [(clave, _con_origen(registro, origen)) for clave, registro in lote]
+        # el listado evita la escritura condicional de las claves que ya se sabe que están
+        guardadas = self._claves_guardadas({clave for clave, _ in lote})
+        nuevos, vistas = [], set()
+        for clave, registro in lote:
+            if clave in vistas or clave in guardadas:
+                continue
+            vistas.add(clave)
+            if self._reclamar(clave):
+                nuevos.append((clave, registro))
+        try:
+            self.agregar_lote([r for _, r in nuevos])
+        except Exception:
+            # liberar las claves para que el reintento del cliente pueda guardarlas
+            for clave, _ in nuevos:
+                try:
+                    self._s3.delete_object(Bucket=self.bucket, Key=self._prefijo_claves + clave)
+                except Exception:
+                    pass
+            raise
+        return len(nuevos), self.total()
+
+    def total(self):
+        """Total de registros; solo lista las claves posteriores a la última estable contada"""
+        with self._lock:
+            recientes = 0
+            for clave in self._claves(self._cursor):
+                if self._estable(clave):
+                    # las claves vienen ordenadas: las estables van antes que las recientes
+                    self._total += self._cantidad(clave)
+                    self._cursor = clave
+                else:
+                    recientes += self._cantidad(clave)
+            return self._total + recientes
+
+    def iterar(self):
+        """Recorrer los registros en orden de llegada, un objeto a la vez"""
+        for clave in self._claves():
+            yield from self._leer(clave)
+
+    def leer_desde(self, cursor=""):
+        """Registros de los objetos estables posteriores a `cursor` (una clave) y el cursor nuevo"""
+        cursor = cursor or ""
+        registros = []
+        for clave in self._claves(cursor):
+            if not self._estable(clave):
+                break
+            registros.extend(self._leer(clave))
+            cursor = clave
+        return registros, cursor
+
+    def consultar(self, desde=None, hasta=None, interes=None, carrera=None, deduplicar=False):
+        """Registros normalizados (COLUMNAS_EXPORTACION) que cumplen los filtros, en orden de llegada"""
+        return _consultar_iterando(self.iterar, desde, hasta, interes, carrera, deduplicar)
+
+    def importar_json(self, origen):
+        """Agregar los registros de un archivo JSON o JSON Lines antiguo"""
+        registros = _leer_json_legado(origen)
+        self.agregar_lote(registros)
+        return len(registros)
+
+    def exportar_json(self, destino):
+        """Escribir todos los registros en el formato JSON antiguo (lista con indent=2)"""
+        _exportar_lista_json(self.iterar(), destino)
+
+
+def abrir_registros(ruta, origen="stand", legado=None):
+    """Abrir el almacén de registros según la ruta: s3://bucket/prefijo, .db/.sqlite o .jsonl"""
+    if ruta.startswith("s3://"):
+        return RegistroS3(ruta, legado=legado)
+    if ruta.endswith((".db", ".sqlite", ".sqlite3")):
+        return RegistroSQLite(ruta, origen=origen, legado=legado)
+    return RegistroJSONL(ruta, legado=legado)
+
+
+def _exportar_lista_json(registros, destino):
+    """Escribir registros como lista JSON sin armar la lista completa en memoria"""
+    temporal = destino + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write("[")
+        vacio = True
+        for registro in registros:
+            f.write("\n  " if vacio else ",\n  ")
+            texto = json.dumps(registro, ensure_ascii=False, indent=2)
+            f.write(texto.replace("\n", "\n  "))
+            vacio = False
+        f.write("]" if vacio else "\n]")
+    os.replace(temporal, destino)
+
+
+def _es_registro(linea):
+    """Si una línea de un JSON Lines es un registro (no vacía y JSON válido)"""
+    if not linea.strip():
+        return False
+    try:
+        json.loads(linea)
+    except ValueError:
+        return False
+    return True
+
+
+def _leer_json_legado(ruta):
+    """Leer un archivo JSON con una lista de registros (o un único objeto) o un JSON Lines"""
+    if ruta.endswith(".jsonl"):
+        return list(RegistroJSONL(ruta).iterar())
+    with open(ruta, "r", encoding="utf-8") as f:
+        contenido = f.read().strip()
+    if not contenido:
+        return []
+    datos = json.loads(contenido)
+    if isinstance(datos, dict):
+        datos = [datos]
+    return datos
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Importar y exportar registros (SQLite .db o JSON Lines .jsonl)")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    imp = sub.add_parser("importar", help="cargar un archivo JSON o JSON Lines antiguo")
+    imp.add_argument("destino", help="almacén de registros, p. ej. registros_sofa.db")
+    imp.add_argument("archivos", nargs="+", help="archivos JSON/JSON Lines a importar")
+    imp.add_argument("--origen", default="stand", choices=sorted(CAMPOS_POR_ORIGEN),
+                     help="formulario que generó los archivos (stand=app.py, dragon=Intento3.py)")
+    exp = sub.add_parser("exportar", help="escribir el almacén como lista JSON")
+    exp.add_argument("almacen")
+    exp.add_argument("json")
+    args = parser.parse_args()
+
+    if args.accion == "importar":
+        registros = abrir_registros(args.destino, origen=args.origen)
+        for archivo in args.archivos:
+            print(f"{archivo}: {registros.importar_json(archivo)} registros importados")
+        print(f"Total en {args.destino}: {registros.total()}")
+    else:
+        registros = abrir_registros(args.almacen)
+        registros.exportar_json(args.json)
+        print(f"Exportados {registros.total()} registros a {args.json}")
+
+
+if __name__ == "__main__":
+    main()
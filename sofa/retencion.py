@@ -0,0 +1,142 @@
+"""Retención de fotos_stand/: borra o archiva fotos viejas y mantiene una cuota de espacio.
+
+Corre como hilo dentro de la app (un barrido cada SOFA_BARRIDO_SEG segundos)
+o desde cron:
+
+    python -m sofa.retencion --horas 48 --cuota-mb 2048 --archivar
+"""
+import argparse
+import os
+import shutil
+import threading
+import time
+import zipfile
+
+from .bloqueo import bloqueo_exclusivo
+from .fotos import CARPETA_FOTOS, CARPETAS_IGNORADAS, recorrer_fotos, ruta_miniatura
+from .galeria import quitar_de_galeria
+
+RETENCION_HORAS = float(os.environ.get("SOFA_RETENCION_HORAS", "48"))
+CUOTA_MB = float(os.environ.get("SOFA_CUOTA_MB", "2048"))
+ARCHIVAR = os.environ.get("SOFA_ARCHIVAR", "0") == "1"
+BARRIDO_SEG = float(os.environ.get("SOFA_BARRIDO_SEG", "300"))
+
+
+class Barredor:
+    """Aplica la política de retención sobre la carpeta de fotos"""
+
+    def __init__(self, carpeta=None, horas=None, cuota_mb=None, archivar=None,
+                 carpeta_archivo="fotos_archivo", al_eliminar=None):
+        self.carpeta = carpeta or CARPETA_FOTOS
+        self.horas = RETENCION_HORAS if horas is None else horas
+        self.cuota_bytes = int((CUOTA_MB if cuota_mb is None else cuota_mb) * 1024 * 1024)
+        self.archivar = ARCHIVAR if archivar is None else archivar
+        self.carpeta_archivo = carpeta_archivo
+        # avisar a quien lleve un índice (IndiceFotos.eliminar)
+        self.al_eliminar = al_eliminar
+        self._hilo = None
+        self._parar = threading.Event()
+
+    def _retirar(self, ruta, mtime, zips):
+        """Archivar (si corresponde) y borrar una foto y su miniatura"""
+        if self.archivar:
+            dia = time.strftime("%Y-%m-%d", time.localtime(mtime))
+            if dia not in zips:
+                os.makedirs(self.carpeta_archivo, exist_ok=True)
+                zips[dia] = zipfile.ZipFile(os.path.join(self.carpeta_archivo, f"{dia}.zip"), "a",
+                                            compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+            zips[dia].write(ruta, arcname=os.path.relpath(ruta, self.carpeta))
+        for archivo in (ruta, ruta_miniatura(ruta)):
+            try:
+                os.remove(archivo)
+            except FileNotFoundError:
+                pass
+        quitar_de_galeria(ruta)
+        if self.al_eliminar:
+            self.al_eliminar(ruta)
+
+    def _limpiar_carpetas_vacias(self):
+        # la carpeta de hoy no se toca: la app puede estar a punto de escribir en ella
+        hoy = time.strftime("%Y-%m-%d")
+        with os.scandir(self.carpeta) as entradas:
+            for entrada in entradas:
+                if not entrada.is_dir() or entrada.name in CARPETAS_IGNORADAS or entrada.name >= hoy:
+                    continue
+                fotos = [e for e in os.scandir(entrada.path) if e.is_file()]
+                if not fotos:
+                    shutil.rmtree(entrada.path, ignore_errors=True)
+
+    def barrer(self):
+        """Un barrido completo. Devuelve (retiradas, bytes_liberados)."""
+        if not os.path.isdir(self.carpeta):
+            return 0, 0
+        # un solo barredor a la vez aunque haya varios procesos de la app
+        with bloqueo_exclusivo(os.path.join(self.carpeta, ".barrido.lock")):
+            fotos = []
+            for entrada in recorrer_fotos(self.carpeta):
+                if entrada.name.startswith(".") or entrada.name.endswith(".tmp"):
+                    continue
+                info = entrada.stat()
+                fotos.append((info.st_mtime, info.st_size, entrada.path))
+            fotos.sort()  # de la más vieja a la más nueva
+
+            limite = time.time() - self.horas * 3600 if self.horas > 0 else None
+            total = sum(tam for _, tam, _ in fotos)
+            retiradas = liberados = 0
+            zips = {}
+            try:
+                for mtime, tam, ruta in fotos:
+                    vieja = limite is not None and mtime < limite
+                    sobra = self.cuota_bytes > 0 and total > self.cuota_bytes
+                    if not (vieja or sobra):
+                        break  # ordenadas por fecha: las siguientes son más nuevas
+                    self._retirar(ruta, mtime, zips)
+                    total -= tam
+                    retiradas += 1
+                    liberados += tam
+            finally:
+                for z in zips.values():
+                    z.close()
+            self._limpiar_carpetas_vacias()
+        return retiradas, liberados
+
+    def _ciclo(self, intervalo):
+        while not self._parar.is_set():
+            try:
+                self.barrer()
+            except Exception as e:
+                print(f"Error en el barrido de {self.carpeta}: {e}")
+            self._parar.wait(intervalo)
+
+    def iniciar(self, intervalo=None):
+        """Barrer en un hilo de fondo cada `intervalo` segundos"""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, args=(intervalo or BARRIDO_SEG,),
+                                          name="barredor-fotos", daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        self._parar.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplicar la retención de fotos una vez")
+    parser.add_argument("carpeta", nargs="?", default=CARPETA_FOTOS)
+    parser.add_argument("--horas", type=float, default=RETENCION_HORAS,
+                        help="borrar fotos más viejas que esto (0 = sin límite de edad)")
+    parser.add_argument("--cuota-mb", type=float, default=CUOTA_MB,
+                        help="espacio máximo de la carpeta (0 = sin cuota)")
+    parser.add_argument("--archivar", action="store_true", default=ARCHIVAR,
+                        help="guardar las fotos retiradas en fotos_archivo/AAAA-MM-DD.zip")
+    parser.add_argument("--carpeta-archivo", default="fotos_archivo")
+    args = parser.parse_args()
+
+    barredor = Barredor(args.carpeta, horas=args.horas, cuota_mb=args.cuota_mb,
+                        archivar=args.archivar, carpeta_archivo=args.carpeta_archivo)
+    retiradas, liberados = barredor.barrer()
+    print(f"{retiradas} fotos retiradas, {liberados / 1024 / 1024:.1f} MB liberados")
+
+
+if __name__ == "__main__":
+    main()
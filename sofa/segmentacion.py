@@ -0,0 +1,422 @@
+"""Segmentación de la persona y composición sobre el fondo del stand.
+
+Los modelos (MediaPipe, clasificador Haar) y los fondos redimensionados se
+cargan una sola vez por proceso y se reutilizan en cada foto. MediaPipe y
+rembg (onnxruntime + u2net) se importan recién cuando se usan por primera vez
+o cuando `precargar` los calienta en segundo plano.
+"""
+import functools
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from . import metricas
+from .cache import CacheLRU
+
+# Solo se verifica que estén instalados; el import real es perezoso
+MP_AVAILABLE = importlib.util.find_spec("mediapipe") is not None
+REMBG_AVAILABLE = importlib.util.find_spec("rembg") is not None
+
+# Ajustes de GrabCut: lado máximo de la copia reducida y número de iteraciones
+GRABCUT_LADO = int(os.environ.get("SOFA_GRABCUT_LADO", "400"))
+GRABCUT_ITERACIONES = int(os.environ.get("SOFA_GRABCUT_ITERACIONES", "3"))
+
+# Ajustes de rembg: modelo, lado de trabajo (u2net trabaja internamente a 320 px)
+# e hilos de onnxruntime por proceso (0 = lo que decida onnxruntime)
+REMBG_MODELO = os.environ.get("SOFA_REMBG_MODELO", "u2net")
+REMBG_LADO = int(os.environ.get("SOFA_REMBG_LADO", "512"))
+REMBG_HILOS = int(os.environ.get("SOFA_REMBG_HILOS", "0"))
+
+# -----------------------
+# Recursos compartidos (uno por proceso)
+# -----------------------
+# Los grafos de MediaPipe y los clasificadores de OpenCV no son seguros para
+# usarse desde varios hilos a la vez (Streamlit corre cada sesión en su hilo)
+_lock_mediapipe = threading.Lock()
+_lock_caras = threading.Lock()
+
+
+_lock_imports = threading.Lock()
+
+
+def _importar(modulo):
+    """Importar un backend pesado una sola vez; si falla se marca como no disponible"""
+    global MP_AVAILABLE, REMBG_AVAILABLE
+    with _lock_imports:
+        try:
+            return importlib.import_module(modulo)
+        except Exception as e:
+            if modulo == "mediapipe":
+                MP_AVAILABLE = False
+            else:
+                REMBG_AVAILABLE = False
+            raise RuntimeError(f"{modulo} no disponible: {e}") from e
+
+
+@functools.lru_cache(maxsize=None)
+def obtener_selfie_segmentation(model_selection=1):
+    """Modelo de MediaPipe Selfie Segmentation, creado una sola vez"""
+    mp = _importar("mediapipe")
+    return mp.solutions.selfie_segmentation.SelfieSegmentation(model_selection=model_selection)
+
+
+@functools.lru_cache(maxsize=None)
+def obtener_sesion_rembg(modelo=None):
+    """Sesión ONNX de rembg, creada una sola vez por proceso (run() es seguro entre hilos)"""
+    rembg = _importar("rembg")
+    if REMBG_HILOS <= 0:
+        return rembg.new_session(modelo or REMBG_MODELO)
+    # rembg arma las SessionOptions de onnxruntime a partir de OMP_NUM_THREADS;
+    # con varios trabajadores conviene repartir los núcleos en vez de pelearlos.
+    # La variable es de todo el proceso (cv2, numpy): se restaura apenas se crea la sesión
+    anterior = os.environ.get("OMP_NUM_THREADS")
+    os.environ["OMP_NUM_THREADS"] = str(REMBG_HILOS)
+    try:
+        return rembg.new_session(modelo or REMBG_MODELO)
+    finally:
+        if anterior is None:
+            os.environ.pop("OMP_NUM_THREADS", None)
+        else:
+            os.environ["OMP_NUM_THREADS"] = anterior
+
+
+@functools.lru_cache(maxsize=None)
+def obtener_detector_caras():
+    """Clasificador Haar de caras frontales, leído del disco una sola vez"""
+    return cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+
+# Cachés acotadas por memoria: máscaras por (hash de la imagen, método) y
+# fondos ya redimensionados por (ruta, mtime, tamaño)
+CACHE_MASCARAS = CacheLRU(int(os.environ.get("SOFA_CACHE_MASCARAS_MB", "128")) * 1024 * 1024)
+CACHE_FONDOS = CacheLRU(int(os.environ.get("SOFA_CACHE_FONDOS_MB", "64")) * 1024 * 1024)
+
+
+def cargar_fondo(fondo_path, size):
+    """Fondo RGB uint8 del tamaño `size` (W, H), cacheado por (ruta, mtime, tamaño)"""
+    clave = (fondo_path, os.path.getmtime(fondo_path), tuple(size))
+    arr = CACHE_FONDOS.get(clave)
+    if arr is None:
+        fondo = Image.open(fondo_path).convert("RGB").resize(tuple(size), Image.LANCZOS)
+        arr = np.array(fondo)
+        arr.setflags(write=False)  # compartido entre sesiones: solo lectura
+        CACHE_FONDOS.put(clave, arr, arr.nbytes)
+    return arr
+
+# -----------------------
+# UTIL: preprocesado para segmentación (reduce tamaño para speed)
+# -----------------------
+def _resize_for_seg(img_pil, max_side=512):
+    w, h = img_pil.size
+    scale = min(max_side / max(w, h), 1.0)
+    if scale < 1.0:
+        new_size = (int(w * scale), int(h * scale))
+        small = img_pil.resize(new_size, Image.LANCZOS)
+    else:
+        small = img_pil.copy()
+        scale = 1.0
+    return small, scale
+
+# -----------------------
+# Método 1: MediaPipe Selfie Segmentation
+# -----------------------
+@metricas.medir("seg_mediapipe")
+def _segment_mediapipe(pil_img):
+    """Devuelve una máscara float32 (0..1) con la probabilidad de sujeto."""
+    if not MP_AVAILABLE:
+        raise RuntimeError("MediaPipe no disponible")
+    # trabajar con tamaño reducido para velocidad
+    small, scale = _resize_for_seg(pil_img, max_side=512)
+    img_np = np.array(small.convert("RGB"))
+    seg = obtener_selfie_segmentation(1)
+    with _lock_mediapipe:
+        results = seg.process(img_np)
+    if results.segmentation_mask is None:
+        return None, scale
+    mask_small = results.segmentation_mask.astype(np.float32)  # valores 0..1
+    # reescalar máscara al tamaño original
+    mask_full = cv2.resize(mask_small, pil_img.size, interpolation=cv2.INTER_LINEAR)
+    return mask_full, scale
+
+# -----------------------
+# Método 2: rembg (u2net) con una sesión ONNX persistente
+# -----------------------
+@metricas.medir("seg_rembg")
+def _segment_rembg(pil_img):
+    """Máscara float32 (0..1) de u2net sobre una copia reducida, reescalada al tamaño original."""
+    if not REMBG_AVAILABLE:
+        raise RuntimeError("rembg no disponible")
+    small, scale = _resize_for_seg(pil_img, max_side=REMBG_LADO)
+    img_np = np.asarray(small.convert("RGB"))
+    # con un arreglo de entrada rembg devuelve un arreglo: sin PNG de ida ni de vuelta
+    mask_small = _importar("rembg").remove(img_np, session=obtener_sesion_rembg(), only_mask=True)
+    mask_small = np.asarray(mask_small)
+    if mask_small.ndim == 3:
+        mask_small = mask_small[..., -1]
+    mask_small = mask_small.astype(np.float32) * (1.0 / 255.0)
+    mask_full = cv2.resize(mask_small, pil_img.size, interpolation=cv2.INTER_LINEAR)
+    return mask_full, scale
+
+# -----------------------
+# Método 3: GrabCut mejorado (fallback)
+# -----------------------
+def _rect_inicial(gray):
+    """Rectángulo inicial para GrabCut: cara más grande ampliada a hombros, o zona central"""
+    H, W = gray.shape[:2]
+    with _lock_caras:
+        faces = obtener_detector_caras().detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=4, minSize=(20,20))
+    if len(faces) > 0:
+        # escoger la cara más grande
+        faces = sorted(faces, key=lambda r: r[2]*r[3], reverse=True)
+        x,y,w,h = faces[0]
+        # ampliar rect para incluir hombros
+        x0 = max(0, x - w//2)
+        y0 = max(0, y - h//2)
+        x1 = min(W-1, x + w + w//2)
+        y1 = min(H-1, y + h + h//2)
+        return (x0, y0, x1 - x0, y1 - y0)
+    # fallback rect central
+    margin_w = int(W * 0.12)
+    margin_h = int(H * 0.10)
+    return (margin_w, margin_h, W - 2*margin_w, H - 2*margin_h)
+
+
+def _refinar_mascara(mask_small, guia_small, guia_full, radio=4, eps=1e-3):
+    """
+    Sube la máscara a resolución completa con un filtro guiado rápido: los
+    coeficientes lineales se calculan sobre la imagen reducida y solo se
+    interpolan, de modo que el borde sigue los contornos de la foto original.
+    """
+    k = (2 * radio + 1, 2 * radio + 1)
+    I = guia_small.astype(np.float32) / 255.0
+    p = mask_small.astype(np.float32)
+    media_I = cv2.boxFilter(I, -1, k)
+    media_p = cv2.boxFilter(p, -1, k)
+    cov_Ip = cv2.boxFilter(I * p, -1, k) - media_I * media_p
+    var_I = cv2.boxFilter(I * I, -1, k) - media_I * media_I
+    a = cov_Ip / (var_I + eps)
+    b = media_p - a * media_I
+    a = cv2.boxFilter(a, -1, k)
+    b = cv2.boxFilter(b, -1, k)
+
+    H, W = guia_full.shape[:2]
+    if (W, H) != (I.shape[1], I.shape[0]):
+        a = cv2.resize(a, (W, H), interpolation=cv2.INTER_LINEAR)
+        b = cv2.resize(b, (W, H), interpolation=cv2.INTER_LINEAR)
+    q = a * (guia_full.astype(np.float32) / 255.0) + b
+    return np.clip(q, 0.0, 1.0, out=q)
+
+
+@metricas.medir("seg_grabcut")
+def _segment_grabcut(pil_img, max_side=None, iteraciones=None):
+    """
+    GrabCut sobre una copia reducida y recortada alrededor del rectángulo
+    inicial; la máscara se sube al tamaño original con `_refinar_mascara`.
+    """
+    max_side = max_side or GRABCUT_LADO
+    iteraciones = iteraciones or GRABCUT_ITERACIONES
+    W, H = pil_img.size
+    small, scale = _resize_for_seg(pil_img, max_side=max_side)
+    img_bgr = cv2.cvtColor(np.array(small.convert("RGB")), cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+
+    # Recortar la zona de trabajo: el rectángulo más un margen de fondo
+    x, y, rw, rh = _rect_inicial(gray)
+    mx, my = max(8, rw // 4), max(8, rh // 4)
+    x0, y0 = max(0, x - mx), max(0, y - my)
+    x1, y1 = min(w, x + rw + mx), min(h, y + rh + my)
+    roi = np.ascontiguousarray(img_bgr[y0:y1, x0:x1])
+
+    mask_gc = np.zeros(roi.shape[:2], np.uint8)
+    bgdModel = np.zeros((1, 65), np.float64)
+    fgdModel = np.zeros((1, 65), np.float64)
+    try:
+        cv2.grabCut(roi, mask_gc, (x - x0, y - y0, rw, rh), bgdModel, fgdModel,
+                    iteraciones, cv2.GC_INIT_WITH_RECT)
+    except Exception:
+        # Si falla, devolver máscara que incluye todo
+        return np.ones((H, W), dtype=np.float32), 1.0
+
+    mask_small = np.zeros((h, w), np.float32)
+    mask_small[y0:y1, x0:x1] = (mask_gc == cv2.GC_FGD) | (mask_gc == cv2.GC_PR_FGD)
+    gray_full = np.array(pil_img.convert("L"))
+    mask = _refinar_mascara(mask_small, gray, gray_full, radio=max(2, int(4 * max_side / 400)))
+    return mask, scale
+
+# -----------------------
+# Función combi: intenta mediapipe -> rembg -> grabcut
+# -----------------------
+def obtener_mascara(pil_img, method="auto"):
+    """
+    Calcula la máscara del sujeto (float32 0..1, tamaño de la imagen) con el
+    mejor método disponible. Devuelve (mascara, metodo_usado).
+    method in {"auto","mediapipe","rembg","grabcut"}
+    """
+    prefer = method.lower()
+    mask = None
+    used = None
+    # MEDIAPIPE
+    if prefer in ("auto", "mediapipe") and MP_AVAILABLE:
+        try:
+            mask, _ = _segment_mediapipe(pil_img)
+            used = "mediapipe"
+        except Exception:
+            mask = None
+    # REMBG
+    if (mask is None) and (prefer in ("auto", "rembg") and REMBG_AVAILABLE):
+        try:
+            mask, _ = _segment_rembg(pil_img)
+            used = "rembg"
+        except Exception:
+            mask = None
+    # GRABCUT fallback
+    if mask is None:
+        try:
+            mask, _ = _segment_grabcut(pil_img)
+            used = "grabcut"
+        except Exception:
+            # como último recurso, máscara completa (no recorte)
+            W, H = pil_img.size
+            mask = np.ones((H, W), dtype=np.float32)
+            used = "none"
+
+    # Asegurar rango 0..1 y tamaño correcto
+    if mask is None:
+        W,H = pil_img.size
+        mask = np.ones((H, W), dtype=np.float32)
+    else:
+        # si la máscara tiene distinto tamaño, reasignar
+        if mask.shape != (pil_img.size[1], pil_img.size[0]):
+            mask = cv2.resize(mask, pil_img.size, interpolation=cv2.INTER_LINEAR)
+    return mask, used
+
+
+def precargar(metodo="auto"):
+    """
+    Cargar el modelo que usará `metodo` para que la primera foto no pague el
+    import ni la lectura del modelo. Devuelve el método precargado o None.
+    """
+    for m in (["mediapipe", "rembg", "grabcut"] if metodo == "auto" else [metodo]):
+        try:
+            if m == "mediapipe" and MP_AVAILABLE:
+                obtener_selfie_segmentation(1)
+                return m
+            if m == "rembg" and REMBG_AVAILABLE:
+                obtener_sesion_rembg()
+                return m
+            if m == "grabcut":
+                obtener_detector_caras()
+                return m
+        except Exception:
+            continue
+    return None
+
+
+# -----------------------
+# Composición en enteros (uint8) con buffers reutilizables
+# -----------------------
+# Desenfoque final del borde según el método; GrabCut ya sale refinado por el
+# filtro guiado y no necesita un segundo desenfoque
+SUAVIZADO_BORDE = {"mediapipe": 15, "rembg": 15, "grabcut": 0, "none": 0}
+
+# Juegos de buffers libres por resolución. No son por hilo: Streamlit corre cada
+# rerun en un hilo nuevo y los buffers de un hilo local no se reutilizarían
+_buffers_libres = OrderedDict()  # (H, W) -> [juego, ...], el tamaño usado hace más tiempo primero
+_lock_buffers = threading.Lock()
+MAX_JUEGOS_POR_TAM = 2  # mezclas simultáneas de la misma resolución que no reservan memoria
+MAX_TAMANOS = 3         # resoluciones distintas que se conservan
+
+
+def _tomar_buffers(H, W):
+    """Sacar del pool un juego de buffers uint8 para fotos de H x W (o crear uno)"""
+    with _lock_buffers:
+        libres = _buffers_libres.get((H, W))
+        if libres:
+            _buffers_libres.move_to_end((H, W))
+            return libres.pop()
+    return {
+        "tam": (H, W),
+        "alfa": np.empty((H, W), np.uint8),
+        "inv": np.empty((H, W), np.uint8),
+        "alfa3": np.empty((H, W, 3), np.uint8),
+        "inv3": np.empty((H, W, 3), np.uint8),
+        "fg": np.empty((H, W, 3), np.uint8),
+        "bg": np.empty((H, W, 3), np.uint8),
+    }
+
+
+def _devolver_buffers(b):
+    with _lock_buffers:
+        libres = _buffers_libres.setdefault(b["tam"], [])
+        _buffers_libres.move_to_end(b["tam"])
+        if len(libres) < MAX_JUEGOS_POR_TAM:
+            libres.append(b)
+        while len(_buffers_libres) > MAX_TAMANOS:
+            _buffers_libres.popitem(last=False)
+
+
+def mezclar(fg, bg, mask, suavizado=0):
+    """
+    Mezcla fg sobre bg (uint8 RGB del mismo tamaño) con la máscara float 0..1
+    (o un alfa uint8 0..255):
+    fg*a/255 + bg*(255-a)/255 con a en uint8, sin arreglos float temporales.
+    Devuelve un arreglo nuevo; los intermedios se reutilizan entre fotos.
+    """
+    H, W = fg.shape[:2]
+    b = _tomar_buffers(H, W)
+    try:
+        if mask.dtype == np.uint8:
+            np.copyto(b["alfa"], mask)  # ya viene como alfa 0..255
+        else:
+            # 0..1 -> 0..255: |mask * 255| saturado a uint8 (valor absoluto, no recorte a [0, 1])
+            cv2.convertScaleAbs(mask, dst=b["alfa"], alpha=255.0)
+        if suavizado:
+            cv2.GaussianBlur(b["alfa"], (suavizado, suavizado), 0, dst=b["alfa"])
+        cv2.bitwise_not(b["alfa"], dst=b["inv"])  # 255 - a
+        cv2.cvtColor(b["alfa"], cv2.COLOR_GRAY2RGB, dst=b["alfa3"])
+        cv2.cvtColor(b["inv"], cv2.COLOR_GRAY2RGB, dst=b["inv3"])
+        cv2.multiply(fg, b["alfa3"], dst=b["fg"], scale=1.0 / 255)
+        cv2.multiply(bg, b["inv3"], dst=b["bg"], scale=1.0 / 255)
+        return cv2.add(b["fg"], b["bg"])
+    finally:
+        _devolver_buffers(b)
+
+
+def calcular_alfa(pil_img, method="auto", clave=None):
+    """
+    Alfa uint8 (0..255, sin el desenfoque final) y método usado. Si se da
+    `clave` (hash del contenido de la imagen) se reutiliza la máscara ya
+    calculada para (clave, método): cambiar de fondo solo cuesta la mezcla.
+    """
+    clave_cache = (clave, method.lower()) if clave is not None else None
+    if clave_cache is not None:
+        en_cache = CACHE_MASCARAS.get(clave_cache)
+        if en_cache is not None:
+            return en_cache
+    mask, used = obtener_mascara(pil_img, method)
+    alfa = cv2.convertScaleAbs(mask, alpha=255.0)
+    alfa.setflags(write=False)
+    if clave_cache is not None:
+        CACHE_MASCARAS.put(clave_cache, (alfa, used), alfa.nbytes)
+    return alfa, used
+
+
+def componer_con_alfa(pil_img, alfa, used, fondo_path="assets/fondo.png"):
+    """Solo la mezcla: persona de `pil_img` sobre el fondo con un alfa ya calculado"""
+    fg = np.asarray(pil_img.convert("RGB"))
+    bg = cargar_fondo(fondo_path, pil_img.size)
+    comp = mezclar(fg, bg, alfa, suavizado=SUAVIZADO_BORDE.get(used, 0))
+    return Image.fromarray(comp)
+
+
+def componer_fondo(pil_img, fondo_path="assets/fondo.png", method="auto", clave=None):
+    """Pone a la persona de `pil_img` sobre el fondo. Devuelve (imagen, metodo_usado)."""
+    alfa, used = calcular_alfa(pil_img, method, clave=clave)
+    return componer_con_alfa(pil_img, alfa, used, fondo_path), used
@@ -0,0 +1,156 @@
+"""Cola de trabajos de foto (segmentación, composición, guardado) en un pool de procesos.
+
+La interfaz envía el trabajo, guarda el id en session_state y vuelve a
+consultar el estado en cada rerun, así la sesión no queda congelada mientras
+otro proceso hace el trabajo pesado.
+"""
+import concurrent.futures
+import importlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from . import metricas
+
+# Número de procesos; 0 ejecuta los trabajos en el mismo hilo (sin pool)
+TRABAJADORES = int(os.environ.get("SOFA_TRABAJADORES", str(max(1, (os.cpu_count() or 2) - 1))))
+
+# Resultados que nadie recogió (sesiones abandonadas) se descartan después de esto
+EXPIRACION_SEG = 600
+
+
+class ColaTrabajos:
+    """Pool de procesos con trabajos identificados por id"""
+
+    def __init__(self, trabajadores=None):
+        self.trabajadores = TRABAJADORES if trabajadores is None else trabajadores
+        self._pool = None
+        if self.trabajadores > 0:
+            # spawn: no duplicar los hilos del servidor de Streamlit con fork
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.trabajadores,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self._trabajos = {}
+        self._lock = threading.Lock()
+
+    def enviar(self, funcion, *args):
+        """Encolar `funcion(*args)` y devolver el id del trabajo"""
+        self._purgar()
+        id_trabajo = uuid.uuid4().hex
+        etapa = "trabajo_" + funcion.__name__.replace("tarea_", "")
+        if metricas.ACTIVAS:
+            # el trabajo se mide dentro del trabajador y trae sus mediciones con el resultado
+            funcion, args = _tarea_medida, (funcion, etapa, args)
+        if self._pool is None:
+            futuro = concurrent.futures.Future()
+            try:
+                futuro.set_result(funcion(*args))
+            except Exception as e:
+                futuro.set_exception(e)
+        else:
+            futuro = self._pool.submit(funcion, *args)
+        with self._lock:
+            self._trabajos[id_trabajo] = (futuro, time.monotonic(), etapa)
+        return id_trabajo
+
+    def estado(self, id_trabajo):
+        """'pendiente', 'listo', 'error' o 'desconocido' (id expirado o ya recogido)"""
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+        if trabajo is None:
+            return "desconocido"
+        futuro = trabajo[0]
+        if not futuro.done():
+            return "pendiente"
+        return "error" if futuro.exception() is not None else "listo"
+
+    def resultado(self, id_trabajo, timeout=None):
+        """Devolver el resultado (o lanzar la excepción del trabajo) y olvidar el trabajo"""
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+        if trabajo is None:
+            raise KeyError(f"Trabajo desconocido: {id_trabajo}")
+        try:
+            resultado = trabajo[0].result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            raise
+        except Exception:
+            metricas.contar(f"errores_{trabajo[2]}")
+            with self._lock:
+                self._trabajos.pop(id_trabajo, None)
+            raise
+        with self._lock:
+            self._trabajos.pop(id_trabajo, None)
+        if metricas.ACTIVAS:
+            resultado, mediciones = resultado
+            metricas.registrar_capturadas(mediciones)
+        return resultado
+
+    def olvidar(self, id_trabajo):
+        """Descartar un trabajo cuyo resultado ya no interesa (se cancela si todavía no empezó)"""
+        with self._lock:
+            trabajo = self._trabajos.pop(id_trabajo, None)
+        if trabajo is not None:
+            trabajo[0].cancel()
+
+    def precalentar(self, funcion, *args):
+        """Correr `funcion(*args)` en cada trabajador sin esperar el resultado (p. ej. cargar modelos)"""
+        if self._pool is None:
+            threading.Thread(target=funcion, args=args, name="precalentar", daemon=True).start()
+            return
+        for _ in range(self.trabajadores):
+            self._pool.submit(funcion, *args)
+
+    def _purgar(self):
+        limite = time.monotonic() - EXPIRACION_SEG
+        with self._lock:
+            viejos = [i for i, (_, creado, _) in self._trabajos.items() if creado < limite]
+            for id_trabajo in viejos:
+                self._trabajos.pop(id_trabajo)[0].cancel()
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# -----------------------
+# Trabajos (funciones de módulo para que el pool pueda enviarlas a otro proceso)
+# -----------------------
+def _tarea_medida(funcion, etapa, args):
+    """Correr `funcion(*args)` midiendo el trabajo y lo que mida adentro (p. ej. seg_*).
+    Devuelve (resultado, mediciones) para que la app las sume a su /metrics."""
+    with metricas.capturar() as mediciones:
+        with metricas.cronometro(etapa):
+            resultado = funcion(*args)
+    return resultado, mediciones
+
+
+def tarea_alfa(foto_bytes, metodo):
+    """Solo la segmentación de una captura. Devuelve (alfa uint8, metodo_usado)."""
+    from PIL import Image
+    from .segmentacion import calcular_alfa
+    imagen = Image.open(io.BytesIO(foto_bytes))
+    return calcular_alfa(imagen, metodo)
+
+
+def tarea_guardar_foto(foto_bytes, ruta, calidad=None):
+    """Guardar una captura (foto maestra sin EXIF y su miniatura), sumarla a la galería y publicarla. Devuelve la ruta."""
+    from .almacen import abrir_almacen
+    from .codificacion import guardar_foto_con_miniatura
+    from .galeria import agregar_a_galeria
+    guardar_foto_con_miniatura(foto_bytes, ruta, calidad=calidad)
+    agregar_a_galeria(ruta)
+    return abrir_almacen().publicar(ruta)
+
+
+def tarea_precargar(metodo=None):
+    """Calentar el proceso trabajador: importar la codificación y, si se indica, el modelo de segmentación"""
+    importlib.import_module(".codificacion", __package__)
+    if metodo is None:
+        return None
+    from .segmentacion import precargar
+    return precargar(metodo)
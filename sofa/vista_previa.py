@@ -0,0 +1,87 @@
+"""Vista previa en vivo del fondo para streamlit-webrtc.
+
+Cada cuadro se segmenta a baja resolución, la máscara se suaviza en el tiempo
+y, si la segmentación no alcanza a sostener los FPS objetivo, solo se
+recalcula cada N cuadros (los demás reutilizan la última máscara). La foto
+final sigue pasando por `componer_fondo` a resolución completa.
+"""
+import importlib.util
+import math
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .segmentacion import cargar_fondo, mezclar, obtener_mascara
+
+# av y streamlit_webrtc se importan solo cuando se abre la vista previa
+WEBRTC_AVAILABLE = (importlib.util.find_spec("av") is not None
+                    and importlib.util.find_spec("streamlit_webrtc") is not None)
+
+
+class ProcesadorVistaPrevia:
+    """Procesador de cuadros de video (interfaz `recv` de streamlit-webrtc)"""
+
+    def __init__(self, fondo_path, metodo="auto", lado=256, fps_objetivo=15, suavizado=0.6):
+        self.fondo_path = fondo_path
+        self.metodo = metodo
+        self.lado = lado
+        self.fps_objetivo = fps_objetivo
+        # peso de la máscara nueva en el promedio exponencial (1 = sin suavizado)
+        self.suavizado = suavizado
+        self._mascara = None
+        self._t_seg = 0.0  # promedio móvil del tiempo de segmentación (s)
+        self._saltar = 1   # segmentar 1 de cada `_saltar` cuadros
+        self._cuadro = 0
+
+    def _actualizar_salto(self, duracion):
+        self._t_seg = duracion if self._t_seg == 0 else 0.8 * self._t_seg + 0.2 * duracion
+        presupuesto = 1.0 / self.fps_objetivo
+        self._saltar = max(1, math.ceil(self._t_seg / presupuesto))
+
+    def _segmentar(self, img_rgb):
+        H, W = img_rgb.shape[:2]
+        escala = min(self.lado / max(W, H), 1.0)
+        tam = (max(1, int(W * escala)), max(1, int(H * escala)))
+        small = cv2.resize(img_rgb, tam, interpolation=cv2.INTER_AREA)
+        inicio = time.perf_counter()
+        mascara, _ = obtener_mascara(Image.fromarray(small), self.metodo)
+        self._actualizar_salto(time.perf_counter() - inicio)
+        if self._mascara is None or self._mascara.shape != mascara.shape:
+            self._mascara = mascara
+        else:
+            # promedio exponencial entre cuadros para evitar parpadeo en el borde
+            cv2.addWeighted(mascara, self.suavizado, self._mascara, 1.0 - self.suavizado,
+                            0.0, dst=self._mascara)
+
+    def procesar(self, img_rgb):
+        """Componer un cuadro RGB uint8 sobre el fondo"""
+        if self._mascara is None or self._cuadro % self._saltar == 0:
+            self._segmentar(img_rgb)
+        self._cuadro += 1
+        H, W = img_rgb.shape[:2]
+        mascara = cv2.resize(self._mascara, (W, H), interpolation=cv2.INTER_LINEAR)
+        fondo = cargar_fondo(self.fondo_path, (W, H))
+        return mezclar(np.ascontiguousarray(img_rgb), fondo, mascara, suavizado=5)
+
+    def recv(self, frame):
+        import av
+        img = frame.to_ndarray(format="rgb24")
+        return av.VideoFrame.from_ndarray(self.procesar(img), format="rgb24")
+
+
+def mostrar_vista_previa(fondo_path, metodo="auto", key="vista_previa"):
+    """Mostrar el video en vivo con el fondo aplicado; devuelve False si falta streamlit-webrtc"""
+    if not WEBRTC_AVAILABLE:
+        return False
+    from streamlit_webrtc import webrtc_streamer
+    ctx = webrtc_streamer(
+        key=key,
+        video_processor_factory=lambda: ProcesadorVistaPrevia(fondo_path, metodo),
+        media_stream_constraints={"video": True, "audio": False},
+        async_processing=True,
+    )
+    if ctx.video_processor:
+        ctx.video_processor.metodo = metodo
+    return True
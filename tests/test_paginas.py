@@ -0,0 +1,47 @@
+"""Humo: cada página de Streamlit corre de punta a punta sin lanzar excepciones.
+
+    python -m pytest -q tests
+
+Atrapa errores a nivel de página (nombres sin definir, imports rotos) que
+compileall no ve. Corre en una carpeta temporal para no tocar los datos reales.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# página -> valores de session_state antes de correrla (p. ej. apagar la actualización automática)
+PAGINAS = {
+    "prueba.py": {},
+    "Intento3.py": {},
+    "pagina_basica/app.py": {},
+    "pagina_basica/admin.py": {"auto_actualizar": False},
+    "pagina_basica/galeria.py": {},
+}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def carpeta_temporal(tmp_path_factory):
+    # los módulos de sofa leen la configuración al importarse: una sola carpeta para todo el módulo
+    carpeta = tmp_path_factory.mktemp("sofa")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(carpeta)
+        mp.syspath_prepend(RAIZ)
+        # sin pool de procesos: los trabajos corren en el hilo del script
+        mp.setenv("SOFA_TRABAJADORES", "0")
+        mp.setenv("SOFA_REGISTROS", str(carpeta / "registros_sofa.db"))
+        mp.setenv("SOFA_FOTOS", str(carpeta / "fotos_stand"))
+        yield carpeta
+
+
+@pytest.mark.parametrize("pagina", PAGINAS)
+def test_pagina_corre_sin_errores(pagina):
+    app = AppTest.from_file(os.path.join(RAIZ, pagina), default_timeout=30)
+    for clave, valor in PAGINAS[pagina].items():
+        app.session_state[clave] = valor
+    app.run()
+    assert not app.exception, [e.message for e in app.exception]